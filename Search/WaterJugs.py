@@ -9,6 +9,8 @@ To use the search routines we subclass the "StateSpace" class and implement spec
  successors
  hashable_state
  print_state
+and, to allow bidirectional search,
+ predecessors
 
 Then we also implement some utility functions to ease the use of SearchEngine.search
 In particular, we implement a way of specifying goal functions and a couple of heurstics.
@@ -51,6 +53,21 @@ class WaterJugs(StateSpace):
             maxpour = min( 3 - self.gal3, self.gal4 ) #at most can only fill up 3 gallon
             States.append( WaterJugs('Pour 4 into 3', self.gval+1, self.gal3+maxpour, self.gal4-maxpour, self) )
         return States
+
+    def predecessors(self):
+        """The states from which one action leads to self. There are only
+        20 states, so we simply find the states among them that have self
+        as a successor. Each predecessor's action is the action that takes
+        it to self, its gval is the cost to reach the goal from it (self
+        is on a path backwards from the goal)."""
+
+        States = list()
+        for gal3 in range(4):
+            for gal4 in range(5):
+                for succ in WaterJugs('', 0, gal3, gal4).successors():
+                    if succ.gal3 == self.gal3 and succ.gal4 == self.gal4:
+                        States.append( WaterJugs(succ.action, self.gval+1, gal3, gal4, self) )
+        return States
     
     def hashable_state(self) :
         return (self.gal3, self.gal4)
@@ -71,6 +88,12 @@ def waterjugs_set_goal(gal3, gal4):
     '''set the current goal'''
     WaterJugs.goal_state = (gal3, gal4)
 
+def waterjugs_goal_states():
+    '''all states matching the current goal (for bidirectional search)'''
+    return [WaterJugs("GOAL", 0, gal3, gal4)
+            for gal3 in range(4) for gal4 in range(5)
+            if waterjugs_goal_fn(WaterJugs("GOAL", 0, gal3, gal4))]
+
 def waterjugs_goal_fn(state):
     '''test if the state is equal to the current goal,
     allow wild cards '*' in the goal state'''
@@ -184,3 +207,11 @@ if __name__ == "__main__":
     print("========================================================")
     print("")
 
+    se.set_strategy('bidirectional')
+    waterjugs_set_goal(2, '*')
+    print("=========Test 7. Bidirectional search to a goal with a wild card==")
+    se.init_search(s0, waterjugs_goal_fn, goal_states=waterjugs_goal_states())
+    final = se.search()
+    if final: final.print_path()    
+    print("========================================================")
+    print("")
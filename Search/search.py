@@ -1,506 +1,2365 @@
-'''Search routines.
-   A) Class StateSpace
-
-      An abstract base class for representing the states in a search
-      space.  Each state has a pointer to the parent that was used to
-      generate it, and the cost of g-value of the sequence of actions
-      that was used to generate it.
-
-      Equivalent states can be reached via different paths, so to
-      avoid exploring the same state multiple times the search
-      routines employ cycle checking using hashing techniques. Hence,
-      each StateSpace state (or object) must be able to return an
-      immutable representation that uniquely represents the state and
-      can be used to index into a dictionary.
-
-      The StateSpace class must be specialized for the particular problem. Each
-      particular problem will define a subclass of StateSpace that will also
-      include information specific to that problem. See WaterJugs.py for an
-      example, and the Class implementation for more details.
-
-
-    B) class SearchEngine
-
-      objects of this class define the search routines. They utilize
-      two auxiliary classes (1) Class sNode---the objects of this class
-      are used to represent nodes in the search space (these nodes
-      contain problem states, i.e., StateSpace objects but they are
-      search nodes not states of the state space.  (2) Class
-      Open---these objects are used to store the set of unexpanded
-      nodes. These objects are search strategy specific. For example,
-      Open is implemented as a stack when doing depth-first search, as
-      a priority queue when doing astar search etc.
-
-      The main routines that the user will employ are in the SearchEngine class.
-      These include the ability to set the search strategy, and to invoke
-      search (using the init_search method) and resume the search after
-      a goal is found (using searchOpen). See the implementation for details. 
-
-    '''
-import heapq
-from collections import deque
-import os
-
-class StateSpace:
-    '''Abstract class for defining State spaces for search routines'''
-    n = 0
-    
-    def __init__(self, action, gval, parent):
-        '''Problem specific state space objects must always include the data items
-           a) self.action === the name of the action used to generate
-              this state from parent. If it is the initial state a good
-              convention is to supply the action name "START"
-           b) self.gval === a number (integer or real) that is the cost
-              of getting to this state.
-           c) parent the state from which this state was generated (by
-              applying "action"
-        '''
-        self.action = action
-        self.gval = gval
-        self.parent = parent
-        self.index = StateSpace.n
-        StateSpace.n = StateSpace.n + 1
-
-    def successors(self):
-        '''This method when invoked on a state space object must return a
-           list of successor states, each with the data items "action"
-           the action used to generate this successor state, "gval" the
-           gval of self plus the cost of the action, and parent set to self.
-           Also any problem specific data must be specified property.'''        
-        raise Exception("Must be overridden in subclass.")
-
-    def hashable_state(self):
-        '''This method must return an immutable and unique representation
-           of the state represented by self. The return value, e.g., a
-           string or tuple, will be used by hashing routines. So if obj1 and
-           obj2, both StateSpace objects then obj1.hashable_state() == obj2.hashable_state()
-           if and only if obj1 and obj2 represent the same problem state.'''
-        raise Exception("Must be overridden in subclass.")
-
-    def print_state(self):
-        '''Print a representation of the state'''
-        raise Exception("Must be overridden in subclass.")
-
-    def print_path(self):
-        '''print the sequence of actions used to reach self'''
-        #can be over ridden to print problem specific information
-        s = self
-        states = []
-        while s:
-            states.append(s)
-            s = s.parent
-        states.pop().print_state()
-        while states:
-            print(" ==> ", end="")
-            states.pop().print_state()
-        print("")
- 
-    def has_path_cycle(self):
-        '''Returns true if self is equal to a prior state on its path'''
-        s = self.parent
-        hc = self.hashable_state()
-        while s:
-            if s.hashable_state() == hc:
-                return True
-            s = s.parent
-        return False
-
-#Constants to denote the search strategy. 
-_DEPTH_FIRST = 0
-_BREADTH_FIRST = 1
-_BEST_FIRST = 2
-_ASTAR = 3
-_UCS = 4
-_CUSTOM = 5
-
-#For best first and astar we use a priority queue. This requires
-#a comparison function for nodes. These constants indicate if we use
-#the gval, the hval or the sum of gval and hval in the comparison.
-_SUM_HG = 0
-_H = 1
-_G = 2
-_C = 3
-
-#Cycle Checking. Either CC_NONE 'none' (no cycle checking), CC_PATH
-#'path' (path checking only) or CC_FULL 'full' (full cycle checking,
-#remembering all previously visited nodes).
-_CC_NONE = 0
-_CC_PATH = 1
-_CC_FULL = 2
-
-#Zero Heuristic Function---for uninformed search don't include heur_fn
-#in call to search engine's search method, defaults heur_fn to the zero fn.
-def _zero_hfn(state):
-    '''Null heuristic (zero)'''
-    return 0
-
-def _fval_function(state):
-  '''default fval function results in Best First Search'''  
-  return state.hval 
-
-class sNode:
-    '''Object of this class form the nodes of the search space.  Each
-    node consists of a search space object (determined by the problem
-    definition) along with the h and g values (the g values is
-    redundant as it is stored in the state, but we make a copy in the
-    node object for convenience), and the number of the node'''
-    
-    n = 0
-    lt_type = _SUM_HG
-    
-    def __init__(self, state, hval, fval_function):
-        self.state = state
-        self.hval = hval
-        self.gval = state.gval
-        self.index = sNode.n
-        self.fval_function = fval_function
-        sNode.n = sNode.n + 1
-
-    def __lt__(self, other):
-        '''For astar and best first we use a priority queue for the
-           OPEN set. This queue stores search nodes waiting to be
-           expanded. Thus we need to define a node1 < node2 function
-           by defining the __lt__ function. Dependent on the type of
-           search this comparison function compares the h-value, the
-           g-value or the f-value of the nodes. Note for the f-value
-           we wish to break ties by letting node1 < node2 if they both
-           have identical f-values but if node1 has a GREATER g
-           value. This means that we expand nodes along deeper paths
-           first causing the search to proceed directly to the goal'''
-                
-        if sNode.lt_type == _SUM_HG:
-            if (self.gval+self.hval) == (other.gval+other.hval):
-                #break ties by greatest gval. 
-                return self.gval > other.gval
-            else: return ((self.gval+self.hval) < (other.gval+other.hval))
-        if sNode.lt_type == _G:
-            return self.gval < other.gval
-        if sNode.lt_type == _H:
-            return self.hval < other.hval    
-        if sNode.lt_type == _C:  
-            return self.fval_function(self) <  other.fval_function(other)          
-        
-        print('sNode class has invalid comparator setting!')
-        
-        #return default of lowest gval (generating UCS behavior)
-        return self.gval < other.gval
-
-class Open:
-    '''Open objects hold the search frontier---the set of unexpanded
-       nodes. Depending on the search strategy used we want to extract
-       nodes from this set in different orders, so set up the object's
-       functions to operate as needed by the particular search
-       strategy'''
-    
-    def __init__(self, search_strategy):
-        if search_strategy == _DEPTH_FIRST:
-            #use stack for OPEN set (last in---most recent successor added---is first out)
-            self.open = []
-            self.insert = self.open.append
-            self.extract = self.open.pop
-        elif search_strategy == _BREADTH_FIRST:
-            #use queue for OPEN (first in---earliest node not yet expanded---is first out)
-            self.open = deque()
-            self.insert = self.open.append
-            self.extract = self.open.popleft
-        elif search_strategy == _UCS:
-            #use priority queue for OPEN (first out is node with lowest gval)
-            self.open = []
-            #set node less than function to compare gvals only
-            sNode.lt_type = _G
-            self.insert = lambda node: heapq.heappush(self.open, node)
-            self.extract = lambda: heapq.heappop(self.open)            
-        elif search_strategy == _BEST_FIRST:
-            #use priority queue for OPEN (first out is node with lowest hval)
-            self.open = []
-            #set node less than function to compare hvals only
-            sNode.lt_type = _H
-            self.insert = lambda node: heapq.heappush(self.open, node)
-            self.extract = lambda: heapq.heappop(self.open)
-        elif search_strategy == _ASTAR:
-            #use priority queue for OPEN (first out is node with lowest fval = gval+hval)
-            self.open = []
-            #set node less than function to compare sums of hval and gval
-            sNode.lt_type = _SUM_HG
-            self.insert = lambda node: heapq.heappush(self.open, node)
-            self.extract = lambda: heapq.heappop(self.open) 
-        elif search_strategy == _CUSTOM:
-            #use priority queue for OPEN (first out is node with lowest fval)
-            self.open = []
-            #set node less than function to compare sums of fval    
-            sNode.lt_type = _C
-            self.insert = lambda node: heapq.heappush(self.open, node)
-            self.extract = lambda: heapq.heappop(self.open)          
-
-    def empty(self): return not self.open
-
-    def print_open(self):
-        print("{", end="")
-        if len(self.open) == 1: 
-            print("   <S{}:{}:{}, g={}, h={}, f=g+h={}>".format(self.open[0].state.index, self.open[0].state.action, self.open[0].state.hashable_state(), self.open[0].gval, self.open[0].hval, self.open[0].gval+self.open[0].hval), end="")
-        else:
-            for nd in self.open:
-                print("   <S{}:{}:{}, g={}, h={}, f=g+h={}>".format(nd.state.index, nd.state.action, nd.state.hashable_state(), nd.gval, nd.hval, nd.gval+nd.hval), end="")
-        print("}")
-
-class SearchEngine:
-    def __init__(self, strategy = 'depth_first', cc_level = 'default'):
-        self.set_strategy(strategy, cc_level)
-        self.trace = 0
-
-    def initStats(self):
-        sNode.n = 0
-        StateSpace.n = 1    #initial state already generated on call so search
-        self.cycle_check_pruned = 0
-        self.cost_bound_pruned = 0
-
-    def trace_on(self, level = 1):
-        '''For debugging, set tracking level 1 or 2'''
-        self.trace = level
-
-    def trace_off(self):
-        '''Turn off tracing'''
-        self.trace = 0
-
-    def set_strategy(self, s, cc = 'default'):
-        if not s in ['depth_first', 'breadth_first', 'ucs', 'best_first', 'astar', 'custom']:
-            print('Unknown search strategy specified:', s)
-            print("Must be one of 'depth_first', 'ucs', 'breadth_first', 'best_first', 'custom' or 'astar'")
-        elif not cc in ['default', 'none', 'path', 'full']:
-            print('Unknown cycle check level', cc)
-            print( "Must be one of ['default', 'none', 'path', 'full']")
-
-        else:
-            if cc == 'default' :
-                if s == 'depth_first' :
-                    self.cycle_check = _CC_PATH
-                else:
-                    self.cycle_check = _CC_FULL
-            elif cc == 'none': self.cycle_check = _CC_NONE
-            elif cc == 'path': self.cycle_check = _CC_PATH
-            elif cc == 'full': self.cycle_check = _CC_FULL
-
-            if   s == 'depth_first'  : self.strategy = _DEPTH_FIRST
-            elif s == 'breadth_first': self.strategy = _BREADTH_FIRST
-            elif s == 'ucs' : self.strategy = _UCS               
-            elif s == 'best_first'   : self.strategy = _BEST_FIRST
-            elif s == 'astar'        : self.strategy = _ASTAR       
-            elif s == 'custom' : self.strategy = _CUSTOM             
-
-    def get_strategy(self):
-        if   self.strategy == _DEPTH_FIRST    : rval = 'depth_first'
-        elif self.strategy == _BREADTH_FIRST  : rval = 'breadth_first'
-        elif self.strategy == _BEST_FIRST     : rval = 'best_first' 
-        elif self.strategy == _UCS          : rval = 'ucs' 
-        elif self.strategy == _ASTAR          : rval = 'astar'      
-        elif self.strategy == _CUSTOM          : rval = 'custom'   
-  
-        rval = rval + ' with '
-
-        if   self.cycle_check == _CC_NONE : rval = rval + 'no cycle checking'
-        elif self.cycle_check == _CC_PATH : rval = rval + 'path checking'
-        elif self.cycle_check == _CC_FULL : rval = rval + 'full cycle checking'
-
-        return rval
-
-    def init_search(self, initState, goal_fn, heur_fn=_zero_hfn, fval_function=_fval_function):
-        """
-        Get ready to search. Call search on this object to run the search.
-
-        @param initState: the state of the puzzle to start the search from.
-        @param goal_fn: the goal function for the puzzle
-        @param heur_fn: the heuristic function to use (only relevant for search strategies that use heuristics)
-        @param fval_fn: the f-value function (only relevant for custom search strategy)
-        """
-        #Perform full cycle checking as follows
-        #a. check state before inserting into OPEN. If we had already reached
-        #   the same state via a cheaper path, don't insert into OPEN.
-        #b. Sometimes we find a new cheaper path to a state (after the older
-        #   more expensive path to the state has already been inserted.
-        #   We deal with this lazily. We check states extracted from OPEN
-        #   and if we have already expanded that state via a cheaper path
-        #   we don't expand it. If we had expanded the state via a more
-        #   expensive path, we re-expand it.
-        
-        self.initStats()
-
-        #BEGIN TRACING
-        if self.trace:
-            print("   TRACE: Search Strategy: ", self.get_strategy())
-            print("   TRACE: Initial State:", end="")
-            initState.print_state()
-        #END 
-        self.open = Open(self.strategy)
-
-        node = sNode(initState, heur_fn(initState), fval_function)      
-
-        #the cycle check dictionary stores the cheapest path (g-val) found
-        #so far to a state. 
-        if self.cycle_check == _CC_FULL:
-            self.cc_dictionary = dict() 
-            self.cc_dictionary[initState.hashable_state()] = initState.gval
-        
-        self.open.insert(node)
-        self.fval_function = fval_function
-        self.goal_fn = goal_fn
-        self.heur_fn = heur_fn
-
-    def search(self, timebound=None, costbound=None):
-        """
-        Start searching, using the parameters set by init_search.
-
-        @param timebound: the maximum amount of time, in seconds, to spend on this search.
-        @param costbound: the cost bound 3-tuple for pruning, as specified in the assignment.
-        """
-
-        goal_node = []
-
-        ###NOW do the search and return the result
-        self.search_start_time = os.times()[0]
-        self.search_stop_time = None
-        if timebound:
-            self.search_stop_time = self.search_start_time + timebound
-        goal_node = self._searchOpen(self.goal_fn, self.heur_fn, self.fval_function, costbound)
-
-        if goal_node:
-            total_search_time = os.times()[0] - self.search_start_time
-            #print("Solution Found with cost of {} in search time of {} sec".format(goal_node.gval, total_search_time))
-            #print("Nodes expanded = {}, states generated = {}, states cycle check pruned = {}, states cost bound pruned = {}".format(
-            #    sNode.n, StateSpace.n, self.cycle_check_pruned, self.cost_bound_pruned))
-            return goal_node.state
-        else:
-            #exited the while without finding goal---search failed
-            total_search_time = os.times()[0] - self.search_start_time            
-            #print("Search Failed! No solution found.")
-            #print("Nodes expanded = {}, states generated = {}, states cycle check pruned = {}, states cost bound pruned = {}".format(
-            #    sNode.n, StateSpace.n, self.cycle_check_pruned, self.cost_bound_pruned))
-            return False
-
-    def _searchOpen(self, goal_fn, heur_fn, fval_function, costbound):
-        """
-        Search, starting from self.open.
-
-        @param goal_fn: the goal function.
-        @param heur_fn: the heuristic function.
-        @param fval_function: the f-value function (only relevant when using a custom search strategy).
-        @param costbound: the cost bound 3-tuple, as described in the assignment.
-        """
-
-        #BEGIN TRACING
-        if self.trace:
-            print("   TRACE: Initial OPEN: ", self.open.print_open())
-            if self.cycle_check == _CC_FULL:
-                print("   TRACE: Initial CC_Dict:", self.cc_dictionary)
-        #END TRACING
-        while not self.open.empty():
-            node = self.open.extract()
-
-            #BEGIN TRACING
-            if self.trace:
-                print("   TRACE: Next State to expand: <S{}:{}:{}, g={}, h={}, f=g+h={}>".format(
-                    node.state.index, node.state.action, node.state.hashable_state(), node.gval, node.hval, node.gval + node.hval))
-                if node.state.gval != node.gval:
-                    print("ERROR: Node gval not equal to state gval!")
-            #END TRACING
-                        
-            if goal_fn(node.state):
-              #node at front of OPEN is a goal...search is completed.
-              return node
-
-            if self.search_stop_time: #timebound check
-              if os.times()[0] > self.search_stop_time:                
-                #exceeded time bound, must terminate search
-                print("TRACE: Search has exceeeded the time bound provided.")
-                return False
-
-             #All states reached by a search node on OPEN have already
-             #been hashed into the self.cc_dictionary. However,
-             #before expanding a node we might have already expanded
-             #an equivalent state with lower g-value. So only expand
-             #the node if the hashed g-value is no greater than the
-             #node's current g-value. 
-
-            #BEGIN TRACING
-            if self.trace:
-                if self.cycle_check == _CC_FULL: print("   TRACE: CC_dict gval={}, node.gval={}".format(
-                    self.cc_dictionary[node.state.hashable_state()], node.gval))
-            #END TRACING
-
-            if self.cycle_check == _CC_FULL and self.cc_dictionary[node.state.hashable_state()] < node.gval:
-                continue
-
-            successors = node.state.successors()
-
-            #BEGIN TRACING
-            if self.trace:
-                print("   TRACE: Expanding Node. Successors = {", end="")
-                for ss in successors:                  
-                    print("<S{}:{}:{}, g={}, h={}, f=g+h={}>, ".format(
-                        ss.index, ss.action, ss.hashable_state(), ss.gval, heur_fn(ss), ss.gval+heur_fn(ss)), end="")                    
-                print("}")
-            #END TRACING
-
-            for succ in successors:
-                hash_state = succ.hashable_state()
-                if self.trace > 1: 
-                  if self.cycle_check == _CC_FULL and hash_state in self.cc_dictionary:
-                      print("   TRACE: Already in CC_dict, CC_dict gval={}, successor state gval={}".format(
-                        self.cc_dictionary[hash_state], succ.gval))   
-
-                #BEGIN TRACING
-                if self.trace > 1:
-                    print("   TRACE: Successor State:", end="")
-                    succ.print_state()
-                    print("   TRACE: Heuristic Value:", heur_fn(succ))
-
-                    if self.cycle_check == _CC_FULL and hash_state in self.cc_dictionary:
-                        print("   TRACE: Already in CC_dict, CC_dict gval={}, successor state gval={}".format(
-                            self.cc_dictionary[hash_state], succ.gval))
-
-                    if self.cycle_check == _CC_PATH and succ.has_path_cycle():
-                        print("   TRACE: On cyclic path")
-                #END TRACING
-
-                prune_succ = (self.cycle_check == _CC_FULL and
-                              hash_state in self.cc_dictionary and
-                              succ.gval > self.cc_dictionary[hash_state]
-                             ) or (
-                              self.cycle_check == _CC_PATH and
-                              succ.has_path_cycle()
-                             )
-
-                if prune_succ :
-                    self.cycle_check_pruned = self.cycle_check_pruned + 1
-                    #BEGIN TRACING
-                    if self.trace > 1:
-                        print(" TRACE: Successor State pruned by cycle checking")
-                        print("\n")                        
-                    #END TRACING
-                    continue
-
-                succ_hval = heur_fn(succ)
-                if costbound is not None and (succ.gval > costbound[0] or
-                                              succ_hval > costbound[1] or
-                                              succ.gval + succ_hval > costbound[2]) : 
-                    self.cost_bound_pruned = self.cost_bound_pruned + 1
-                    if self.trace > 1:
-                      print(" TRACE: Successor State pruned, over current cost bound of {}", costbound)
-                      print("\n") 
-                    continue                    
-
-                #passed all cycle checks and costbound checks ...add to open
-                self.open.insert(sNode(succ, succ_hval, node.fval_function))
-
-                #BEGIN TRACING
-                if self.trace > 1:
-                    print(" TRACE: Successor State added to OPEN")
-                    print("\n")
-                #END TRACING
-
-                #record cost of this path in dictionary.
-                if self.cycle_check == _CC_FULL:
-                    self.cc_dictionary[hash_state] = succ.gval
-
-        #end of while--OPEN is empty and no solution
-        return False
-            
+'''Search routines.
+   A) Class StateSpace
+
+      An abstract base class for representing the states in a search
+      space.  Each state has a pointer to the parent that was used to
+      generate it, and the cost of g-value of the sequence of actions
+      that was used to generate it.
+
+      Equivalent states can be reached via different paths, so to
+      avoid exploring the same state multiple times the search
+      routines employ cycle checking using hashing techniques. Hence,
+      each StateSpace state (or object) must be able to return an
+      immutable representation that uniquely represents the state and
+      can be used to index into a dictionary.
+
+      The StateSpace class must be specialized for the particular problem. Each
+      particular problem will define a subclass of StateSpace that will also
+      include information specific to that problem. See WaterJugs.py for an
+      example, and the Class implementation for more details.
+
+
+    B) class SearchEngine
+
+      objects of this class define the search routines. They utilize
+      two auxiliary classes (1) Class sNode---the objects of this class
+      are used to represent nodes in the search space (these nodes
+      contain problem states, i.e., StateSpace objects but they are
+      search nodes not states of the state space.  (2) Class
+      Open---these objects are used to store the set of unexpanded
+      nodes. These objects are search strategy specific. For example,
+      Open is implemented as a stack when doing depth-first search, as
+      a priority queue when doing astar search etc. IndexedOpen is an
+      alternative priority queue that holds one node per state, and
+      BucketOpen a bucket queue for integer keys (see
+      SearchEngine.set_open_backend).
+
+      The main routines that the user will employ are in the SearchEngine class.
+      These include the ability to set the search strategy, and to invoke
+      search (using the init_search method) and resume the search after
+      a goal is found (using searchOpen). See the implementation for details. 
+
+      For debugging, trace_on makes the searches report each step to a
+      trace sink: print_trace (the default) prints the messages, a
+      TraceBuffer keeps the last ones in memory.
+
+    C) class ARAStarEngine
+
+      a SearchEngine that runs Anytime Repairing A*, i.e., weighted A*
+      with a decreasing sequence of weights that reuses the search effort
+      of the previous weights, reporting each improved solution.
+
+    D) function portfolio_search
+
+      runs several differently configured SearchEngines on the same
+      problem in parallel (one per process) and returns the first (or
+      the cheapest) solution found within a shared wall-clock budget.
+
+    '''
+import heapq
+import itertools
+import functools
+import copy
+import multiprocessing
+import operator
+import time
+import io
+import contextlib
+from array import array
+from collections import deque, OrderedDict
+
+class StateSpace:
+    '''Abstract class for defining State spaces for search routines'''
+    #subclasses that also declare __slots__ carry no per-state __dict__
+    __slots__ = ('action', 'gval', 'parent', 'index')
+
+    #source of the (process wide) unique index used to label states in
+    #traces. Search statistics are kept by each SearchEngine instead.
+    _index_counter = itertools.count()
+
+    def __init__(self, action, gval, parent):
+        '''Problem specific state space objects must always include the data items
+           a) self.action === the name of the action used to generate
+              this state from parent. If it is the initial state a good
+              convention is to supply the action name "START"
+           b) self.gval === a number (integer or real) that is the cost
+              of getting to this state.
+           c) parent the state from which this state was generated (by
+              applying "action"
+        '''
+        self.action = action
+        self.gval = gval
+        self.parent = parent
+        self.index = next(StateSpace._index_counter)
+
+    def successors(self):
+        '''This method when invoked on a state space object must return a
+           list of successor states, each with the data items "action"
+           the action used to generate this successor state, "gval" the
+           gval of self plus the cost of the action, and parent set to self.
+           Also any problem specific data must be specified property.'''        
+        raise Exception("Must be overridden in subclass.")
+
+    def iter_successors(self):
+        '''Optional, the successor states one at a time (used by a search
+           with deferred evaluation, see SearchEngine.set_deferred_evaluation).
+           Subclasses can override this with a generator.'''
+        return iter(self.successors())
+
+    def predecessors(self):
+        '''Optional, only needed for bidirectional search. This method
+           must return a list of the states from which self can be reached
+           by one action, each with the data items "action" the name of
+           the action that takes the predecessor to self, "gval" the gval
+           of self plus the cost of that action, and parent set to self
+           (for a bidirectional search the gval of a state reached
+           backwards is its cost to reach the goal).'''
+        raise Exception("Must be overridden in subclass to use bidirectional search.")
+
+    def hashable_state(self):
+        '''This method must return an immutable and unique representation
+           of the state represented by self. The return value, e.g., a
+           string or tuple, will be used by hashing routines. So if obj1 and
+           obj2, both StateSpace objects then obj1.hashable_state() == obj2.hashable_state()
+           if and only if obj1 and obj2 represent the same problem state.'''
+        raise Exception("Must be overridden in subclass.")
+
+    def compact_state(self):
+        '''Like hashable_state, an immutable and unique representation of
+           the state, used when the search engine is asked to store compact
+           keys in its closed set (see SearchEngine.set_closed_set). Can be
+           overridden to return something smaller, e.g., packed bytes or an
+           int, the default is hashable_state().'''
+        return self.hashable_state()
+
+    def canonical_state(self):
+        '''A representation of the state under which the search engine, if
+           asked to (see SearchEngine.set_closed_set), merges states that
+           are equivalent for the problem, e.g., that only differ in ways
+           that can be undone. Merged states are only searched once, via the
+           cheapest path found to any of them, so the search need no longer
+           be optimal. The default is hashable_state() (nothing is merged).'''
+        return self.hashable_state()
+
+    def print_state(self):
+        '''Print a representation of the state'''
+        raise Exception("Must be overridden in subclass.")
+
+    def print_path(self):
+        '''print the sequence of actions used to reach self'''
+        #can be over ridden to print problem specific information
+        s = self
+        states = []
+        while s:
+            states.append(s)
+            s = s.parent
+        states.pop().print_state()
+        while states:
+            print(" ==> ", end="")
+            states.pop().print_state()
+        print("")
+ 
+    def has_path_cycle(self):
+        '''Returns true if self is equal to a prior state on its path.
+           This walks the whole path, depth first search and IDA* check
+           their successors against a set of the states on the path instead.'''
+        s = self.parent
+        hc = self.hashable_state()
+        while s:
+            if s.hashable_state() == hc:
+                return True
+            s = s.parent
+        return False
+
+#Constants to denote the search strategy. 
+_DEPTH_FIRST = 0
+_BREADTH_FIRST = 1
+_BEST_FIRST = 2
+_ASTAR = 3
+_UCS = 4
+_CUSTOM = 5
+_IDASTAR = 6
+_BIDIRECTIONAL = 7
+
+#Cycle Checking. Either CC_NONE 'none' (no cycle checking), CC_PATH
+#'path' (path checking only) or CC_FULL 'full' (full cycle checking,
+#remembering all previously visited nodes).
+_CC_NONE = 0
+_CC_PATH = 1
+_CC_FULL = 2
+
+#Closed set keys. Either 'hash' (StateSpace.hashable_state) or 'compact'
+#(StateSpace.compact_state).
+_CC_KEYS = {'hash': operator.methodcaller('hashable_state'),
+            'compact': operator.methodcaller('compact_state'),
+            'canonical': operator.methodcaller('canonical_state')}
+
+#Time budgets. The clock is either 'wall' (wall-clock time, monotonic) or
+#'cpu' (cpu time of this process, user plus system).
+_CLOCKS = {'wall': time.perf_counter, 'cpu': time.process_time}
+
+class CancelToken:
+    '''Cooperative cancellation of searches: a search whose Deadline
+       holds this token stops (as if its time bound was exceeded) soon
+       after cancel() is called, e.g., from another thread. One token can
+       be shared by several searches.'''
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class Deadline:
+    '''A time budget of seconds (None for no limit) measured on clock
+       ('wall' or 'cpu'), optionally cancellable through a CancelToken.
+       expired() is called once per node expansion, so to keep it cheap it
+       only reads the clock (and the token) every check_every calls.
+       A Deadline can be passed to SearchEngine.search instead of a
+       timebound, e.g., to share one budget between several calls.'''
+
+    def __init__(self, seconds = None, clock = 'wall', check_every = 64, token = None):
+        if not clock in _CLOCKS:
+            print('Unknown clock', clock)
+            print("Must be one of", list(_CLOCKS))
+            clock = 'wall'
+        self.clock = _CLOCKS[clock]
+        self.start_time = self.clock()
+        self.stop_time = None
+        if seconds is not None:
+            self.stop_time = self.start_time + seconds
+        self.check_every = check_every
+        self.token = token
+        self._countdown = 1   #check on the first call
+
+    def expired(self):
+        '''True if the budget is used up or the search was cancelled'''
+        self._countdown = self._countdown - 1
+        if self._countdown > 0:
+            return False
+        self._countdown = self.check_every
+        if self.token is not None and self.token.cancelled:
+            return True
+        return self.stop_time is not None and self.clock() > self.stop_time
+
+    def elapsed(self):
+        '''Seconds used so far'''
+        return self.clock() - self.start_time
+
+    def remaining(self):
+        '''Seconds left (0 if cancelled, inf if there is no limit)'''
+        if self.token is not None and self.token.cancelled:
+            return 0
+        if self.stop_time is None:
+            return float('inf')
+        return max(0, self.stop_time - self.clock())
+
+#Trace sinks. SearchEngine.trace_on sends each trace message (a string)
+#to a sink, any function of the message.
+def print_trace(message):
+    '''The default trace sink, prints the message'''
+    print("   TRACE:", message)
+
+class TraceBuffer:
+    '''A trace sink that keeps the last max_size messages in memory (a ring
+       buffer) instead of printing them, e.g., to look at the last steps of
+       a long search after it has ended.'''
+
+    def __init__(self, max_size = 1000):
+        self.messages = deque(maxlen=max_size)
+
+    def __call__(self, message):
+        self.messages.append(message)
+
+    def __len__(self): return len(self.messages)
+
+    def __iter__(self): return iter(self.messages)
+
+    def clear(self):
+        self.messages.clear()
+
+    def print_trace(self):
+        for message in self.messages:
+            print_trace(message)
+
+def _printed(print_fn):
+    '''Return what print_fn() prints (e.g., a state's print_state), for the
+       trace messages'''
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        print_fn()
+    return out.getvalue().rstrip("\n")
+
+#Successor functions used by the engines. When profiling is on these
+#are replaced by versions that time the calls.
+_successors = operator.methodcaller('successors')
+_iter_successors = operator.methodcaller('iter_successors')
+_predecessors = operator.methodcaller('predecessors')
+
+#Zero Heuristic Function---for uninformed search don't include heur_fn
+#in call to search engine's search method, defaults heur_fn to the zero fn.
+def _zero_hfn(state):
+    '''Null heuristic (zero)'''
+    return 0
+
+def _fval_function(state):
+  '''default fval function results in Best First Search'''  
+  return state.hval 
+
+class sNode:
+    '''Object of this class form the nodes of the search space.  Each
+    node consists of a search space object (determined by the problem
+    definition) along with the h value (the g value is read from the
+    state). A deferred node has not had its heuristic evaluated yet, its
+    hval is that of its parent. In the compact trace mode (see
+    SearchEngine.set_compact_trace) parent_slot is the slot of the node's
+    parent in the trace table of the search.
+
+    The f-value function of a custom search is kept by OPEN, the
+    fval_function argument is only there for compatibility.'''
+
+    __slots__ = ('state', 'hval', 'deferred', 'parent_slot')
+
+    def __init__(self, state, hval, fval_function=None, deferred=False):
+        self.state = state
+        self.hval = hval
+        self.deferred = deferred
+        self.parent_slot = None
+
+    @property
+    def gval(self):
+        return self.state.gval
+
+#A new NaN float is neither equal to, less than nor greater than any other
+#value. Ending each OPEN entry with one makes heapq (in C) treat entries
+#with equal keys as equal, without ever comparing their nodes.
+_unordered = functools.partial(float, 'nan')
+
+class Open:
+    '''Open objects hold the search frontier---the set of unexpanded
+       nodes. Depending on the search strategy used we want to extract
+       nodes from this set in different orders, so set up the object's
+       functions to operate as needed by the particular search
+       strategy.
+
+       For the priority queue strategies the heap does not hold the
+       nodes themselves but tuples (key..., tie, node). The key is
+       computed once when the node is inserted and tie is a new NaN (see
+       _unordered), so heapq only ever compares numbers and never calls
+       back into python code to order two nodes. Entries with equal keys
+       compare as equal, so they are extracted in the order the heap
+       leaves them in: the same tie order as the original heap of sNodes,
+       whose comparison found such nodes equal. A first in first out (or
+       last in first out) insertion counter in place of tie changes the
+       expansion order and solves fewer of the autograder problems in
+       time. Keys are:
+         ucs        (gval)
+         best_first (hval)
+         astar      (gval+hval, -gval) -- ties on f are broken in favour
+                    of the GREATER gval, so that we expand nodes along
+                    deeper paths first causing the search to proceed
+                    directly to the goal
+         custom     (fval_function(node))'''
+
+    def __init__(self, search_strategy, fval_function = None):
+        self.strategy = search_strategy
+        self.fval_function = fval_function
+        if search_strategy == _DEPTH_FIRST:
+            #use stack for OPEN set (last in---most recent successor added---is first out)
+            self.open = []
+            self.insert = self.open.append
+            self.extract = self.open.pop
+        elif search_strategy == _BREADTH_FIRST:
+            #use queue for OPEN (first in---earliest node not yet expanded---is first out)
+            self.open = deque()
+            self.insert = self.open.append
+            self.extract = self.open.popleft
+        else:
+            #use priority queue for OPEN (first out is the node with the
+            #lowest key, see above)
+            self.open = []
+            if search_strategy == _UCS:
+                self.insert = self._insert_g
+            elif search_strategy == _BEST_FIRST:
+                self.insert = self._insert_h
+            elif search_strategy == _ASTAR:
+                self.insert = self._insert_sum_hg
+            elif search_strategy == _CUSTOM:
+                self.insert = self._insert_custom
+            self.extract = self._extract_heap
+
+    def _insert_g(self, node):
+        heapq.heappush(self.open, (node.gval, _unordered(), node))
+
+    def _insert_h(self, node):
+        heapq.heappush(self.open, (node.hval, _unordered(), node))
+
+    def _insert_sum_hg(self, node):
+        heapq.heappush(self.open, (node.gval + node.hval, -node.gval, _unordered(), node))
+
+    def _insert_custom(self, node):
+        heapq.heappush(self.open, (self.fval_function(node), _unordered(), node))
+
+    def _extract_heap(self):
+        return heapq.heappop(self.open)[-1]
+
+    def putback(self, node):
+        '''Return a node that was just extracted to OPEN, so that it is
+           the next node extracted again (up to ties on the key)'''
+        if self.strategy == _BREADTH_FIRST:
+            self.open.appendleft(node)
+        else:
+            self.insert(node)
+
+    def requeue(self, node):
+        '''Re-insert a node that was just extracted (and whose key has
+           changed) unless it would still be the first node extracted.
+           Returns True if the node was put back on OPEN.'''
+        if self.strategy in (_DEPTH_FIRST, _BREADTH_FIRST) or not self.open:
+            return False
+        self.insert(node)
+        if self.open[0][-1] is node:
+            heapq.heappop(self.open)
+            return False
+        return True
+
+    def prune(self, keep):
+        '''Remove in one pass every node for which keep(node) is false
+           (restoring the heap afterwards). Returns the number removed.'''
+        before = len(self.open)
+        if self.strategy in (_DEPTH_FIRST, _BREADTH_FIRST):
+            kept = [node for node in self.open if keep(node)]
+            self.open.clear()
+            self.open.extend(kept)
+        else:
+            self.open[:] = [entry for entry in self.open if keep(entry[-1])]
+            heapq.heapify(self.open)
+        return before - len(self.open)
+
+    def rekey(self, fval_function):
+        '''Change the f-value function and rebuild the priority queue with
+           the new keys'''
+        self.fval_function = fval_function
+        if self.strategy in (_DEPTH_FIRST, _BREADTH_FIRST):
+            return
+        nodes = [entry[-1] for entry in self.open]
+        self.open[:] = []
+        for node in nodes:
+            self.insert(node)
+
+    def empty(self): return not self.open
+
+    def __len__(self): return len(self.open)
+
+    def peek(self):
+        '''Return (without removing it) the node that extract would return'''
+        if self.strategy == _DEPTH_FIRST:
+            return self.open[-1]
+        if self.strategy == _BREADTH_FIRST:
+            return self.open[0]
+        return self.open[0][-1]
+
+    def first_key(self):
+        '''Return the key (the first one, e.g., the f-value for astar) of
+           the node extract would return. Priority queue strategies only.'''
+        return self.open[0][0]
+
+    def nodes(self):
+        '''Return the nodes currently on OPEN (in no particular order)'''
+        if self.strategy in (_DEPTH_FIRST, _BREADTH_FIRST):
+            return list(self.open)
+        return [entry[-1] for entry in self.open]
+
+    def print_open(self):
+        print("{", end="")
+        for nd in self.nodes():
+            print("   <S{}:{}:{}, g={}, h={}, f=g+h={}>".format(nd.state.index, nd.state.action, nd.state.hashable_state(), nd.gval, nd.hval, nd.gval+nd.hval), end="")
+        print("}")
+
+class IndexedOpen(Open):
+    '''OPEN for the priority queue strategies as an indexed binary heap:
+       the heap position of each node is kept in a dictionary under the
+       key of its state (by default its hashable_state), so OPEN holds at
+       most one node per state. Inserting a node for a state that is
+       already on OPEN replaces the node there if its gval is lower and
+       moves it to its new place (a decrease-key), instead of leaving a
+       stale node behind to be skipped when it is extracted; a node whose
+       gval is not lower is dropped. Needs full cycle checking, so that
+       the nodes of a state not on OPEN (e.g., already expanded) are only
+       inserted when a cheaper path to it has been found.
+
+       The entries are (key..., tiebreak, state key, node), with the keys
+       of Open. The tiebreak counter keeps the state keys from being
+       compared, so unlike Open, nodes with equal keys are extracted
+       first in first out. The sifting is done in python, so each operation costs
+       more than with heapq; what is saved is the space and the
+       extractions of the stale nodes.'''
+
+    def __init__(self, search_strategy, fval_function = None, state_key = _CC_KEYS['hash']):
+        Open.__init__(self, search_strategy, fval_function)
+        self._tiebreak = itertools.count()
+        self.state_key = state_key
+        self.position = dict()
+        self.decreased = 0
+        if search_strategy == _UCS:
+            self._key = lambda node: (node.gval,)
+        elif search_strategy == _BEST_FIRST:
+            self._key = lambda node: (node.hval,)
+        elif search_strategy == _ASTAR:
+            self._key = lambda node: (node.gval + node.hval, -node.gval)
+        else:
+            self._key = lambda node: (self.fval_function(node),)
+        self.insert = self._insert_indexed
+        self.extract = self._extract_indexed
+
+    def _insert_indexed(self, node):
+        skey = self.state_key(node.state)
+        entry = self._key(node) + (next(self._tiebreak), skey, node)
+        i = self.position.get(skey)
+        if i is None:
+            self.open.append(entry)
+            self._sift_up(len(self.open) - 1, entry)
+        else:
+            #keep the cheaper of the two nodes of the same state
+            old = self.open[i]
+            if not node.gval < old[-1].gval:
+                return
+            self.decreased = self.decreased + 1
+            if entry < old:
+                self._sift_up(i, entry)
+            else:
+                self._sift_down(i, entry)
+
+    def _extract_indexed(self):
+        heap = self.open
+        last = heap.pop()
+        if not heap:
+            del self.position[last[-2]]
+            return last[-1]
+        first = heap[0]
+        del self.position[first[-2]]
+        self._sift_down(0, last)
+        return first[-1]
+
+    def _sift_up(self, i, entry):
+        '''Put entry at position i, moving it up towards the root as needed'''
+        heap = self.open
+        position = self.position
+        while i > 0:
+            parent = (i - 1) >> 1
+            if not entry < heap[parent]:
+                break
+            heap[i] = heap[parent]
+            position[heap[i][-2]] = i
+            i = parent
+        heap[i] = entry
+        position[entry[-2]] = i
+
+    def _sift_down(self, i, entry):
+        '''Put entry at position i, moving it down towards the leaves as needed'''
+        heap = self.open
+        position = self.position
+        n = len(heap)
+        while True:
+            child = 2*i + 1
+            if child >= n:
+                break
+            if child + 1 < n and heap[child + 1] < heap[child]:
+                child = child + 1
+            if not heap[child] < entry:
+                break
+            heap[i] = heap[child]
+            position[heap[i][-2]] = i
+            i = child
+        heap[i] = entry
+        position[entry[-2]] = i
+
+    def _reindex(self):
+        '''Restore the heap and the positions after self.open was changed'''
+        heapq.heapify(self.open)
+        self.position = dict((entry[-2], i) for i, entry in enumerate(self.open))
+
+    def requeue(self, node):
+        if not self.open:
+            return False
+        self.insert(node)
+        if self.open[0][-1] is node:
+            self.extract()
+            return False
+        return True
+
+    def prune(self, keep):
+        before = len(self.open)
+        self.open[:] = [entry for entry in self.open if keep(entry[-1])]
+        self._reindex()
+        return before - len(self.open)
+
+    def rekey(self, fval_function):
+        self.fval_function = fval_function
+        entries = sorted(self.open, key=operator.itemgetter(-3))
+        self.open[:] = [self._key(entry[-1]) + entry[-3:] for entry in entries]
+        self._reindex()
+
+def _integral(value):
+    '''True if value is a whole number (or inf), a key for BucketOpen'''
+    return type(value) is int or isinstance(value, float) and (value.is_integer() or value == float('inf'))
+
+class BucketOpen(Open):
+    '''OPEN for ucs, best_first and astar as a bucket queue, for searches
+       whose keys (gval, hval or gval + hval) are small non-negative
+       integers (e.g., unit action costs and an integer heuristic). The
+       nodes with key k are kept in buckets[k] and the first non-empty
+       bucket is found by moving up from the lowest key inserted since it
+       was last found, so insert and extract take constant time (amortized)
+       instead of the O(log n) of the heap. Nodes with key inf (e.g.,
+       deadlocks) are kept in a bucket of their own, extracted last.
+
+       The nodes are extracted in the same order of key as from the heap
+       of Open (for astar, greater gval first on equal f), but nodes with
+       equal keys come out first in first out instead of in heap order,
+       so the search can expand them in a different order. An astar
+       bucket is therefore a list of FIFO queues indexed by gval, with the
+       greatest gval in use. Not used unless asked for (see
+       SearchEngine.set_open_backend).
+
+       If a key that is not such an integer (or is larger than max_key) is
+       inserted, the nodes are moved to a heap and from then on OPEN works
+       as a plain Open (self.fallback is True).'''
+
+    max_key = 100000
+
+    def __init__(self, search_strategy, fval_function = None):
+        Open.__init__(self, search_strategy, fval_function)
+        self.buckets = []
+        self.inf_bucket = None
+        self.low = 0   #no bucket below low holds a node
+        self.size = 0
+        self.fallback = False
+        self.insert = self._insert_bucket
+        self.extract = self._extract_bucket
+
+    def _key(self, node):
+        if self.strategy == _UCS:
+            return node.gval
+        if self.strategy == _BEST_FIRST:
+            return node.hval
+        return node.gval + node.hval
+
+    def _new_bucket(self):
+        if self.strategy == _ASTAR:
+            return [None, []]   #[greatest gval in use, FIFO queues by gval]
+        return deque()
+
+    def _insert_bucket(self, node):
+        key = self._key(node)
+        if type(key) is not int:
+            if key == float('inf'):
+                if self.inf_bucket is None:
+                    self.inf_bucket = self._new_bucket()
+                if self._push(self.inf_bucket, node):
+                    self.size = self.size + 1
+                    return
+            elif isinstance(key, float) and key.is_integer():
+                key = int(key)
+        if type(key) is not int or key < 0 or key > self.max_key:
+            self._fall_back()
+            self.insert(node)
+            return
+        buckets = self.buckets
+        while len(buckets) <= key:
+            buckets.append(None)
+        if buckets[key] is None:
+            buckets[key] = self._new_bucket()
+        if not self._push(buckets[key], node):
+            self._fall_back()
+            self.insert(node)
+            return
+        self.size = self.size + 1
+        if key < self.low:
+            self.low = key
+
+    def _push(self, bucket, node):
+        '''Add node to bucket, returns False if it can't (a gval that is not
+           a non-negative integer in an astar bucket)'''
+        if self.strategy != _ASTAR:
+            bucket.append(node)
+            return True
+        g = node.gval
+        if type(g) is not int:
+            if not (isinstance(g, float) and g.is_integer()):
+                return False
+            g = int(g)
+        if g < 0 or g > self.max_key:
+            return False
+        queues = bucket[1]
+        while len(queues) <= g:
+            queues.append(None)
+        if queues[g] is None:
+            queues[g] = deque()
+        queues[g].append(node)
+        if bucket[0] is None or g > bucket[0]:
+            bucket[0] = g
+        return True
+
+    def _first(self, bucket, remove):
+        '''The first node of bucket (removed if remove), None if it is empty'''
+        if self.strategy != _ASTAR:
+            if not bucket:
+                return None
+            return bucket.popleft() if remove else bucket[0]
+        queues = bucket[1]
+        g = bucket[0]
+        while g is not None and g >= 0 and not queues[g]:
+            g = g - 1
+        if g is None or g < 0:
+            bucket[0] = None
+            return None
+        bucket[0] = g
+        return queues[g].popleft() if remove else queues[g][0]
+
+    def _find(self, remove):
+        buckets = self.buckets
+        while self.low < len(buckets):
+            bucket = buckets[self.low]
+            if bucket is not None:
+                node = self._first(bucket, remove)
+                if node is not None:
+                    return node
+            self.low = self.low + 1
+        if self.inf_bucket is not None:
+            return self._first(self.inf_bucket, remove)
+        return None
+
+    def _extract_bucket(self):
+        self.size = self.size - 1
+        return self._find(True)
+
+    def _bucket_nodes(self):
+        '''The nodes in the order they would be extracted'''
+        nodes = []
+        for bucket in self.buckets + [self.inf_bucket]:
+            if bucket is None:
+                continue
+            if self.strategy != _ASTAR:
+                nodes.extend(bucket)
+            else:
+                for queue in reversed(bucket[1]):
+                    if queue:
+                        nodes.extend(queue)
+        return nodes
+
+    def _reset(self, nodes):
+        '''Empty the buckets and insert nodes (in that order)'''
+        self.buckets = []
+        self.inf_bucket = None
+        self.low = 0
+        self.size = 0
+        for node in nodes:
+            self.insert(node)
+
+    def _fall_back(self):
+        '''Move the nodes to a heap, OPEN is a plain Open from now on'''
+        nodes = self._bucket_nodes()
+        self.fallback = True
+        self.buckets = []
+        self.inf_bucket = None
+        self.size = 0
+        Open.__init__(self, self.strategy, self.fval_function)
+        for node in nodes:
+            self.insert(node)
+
+    def putback(self, node):
+        self.insert(node)
+
+    def requeue(self, node):
+        if self.empty():
+            return False
+        self.insert(node)
+        if self.peek() is node:
+            self.extract()
+            return False
+        return True
+
+    def prune(self, keep):
+        if self.fallback:
+            return Open.prune(self, keep)
+        before = self.size
+        self._reset([node for node in self._bucket_nodes() if keep(node)])
+        return before - len(self)
+
+    def rekey(self, fval_function):
+        if self.fallback:
+            Open.rekey(self, fval_function)
+        else:
+            #the keys of these strategies do not use the f-value function
+            self.fval_function = fval_function
+
+    def empty(self):
+        if self.fallback:
+            return not self.open
+        return not self.size
+
+    def __len__(self):
+        if self.fallback:
+            return len(self.open)
+        return self.size
+
+    def peek(self):
+        if self.fallback:
+            return Open.peek(self)
+        return self._find(False)
+
+    def first_key(self):
+        if self.fallback:
+            return Open.first_key(self)
+        return self._key(self._find(False))
+
+    def nodes(self):
+        if self.fallback:
+            return Open.nodes(self)
+        return self._bucket_nodes()
+
+class _BoundedClosedSet(OrderedDict):
+    '''Cycle check dictionary holding at most max_size states. When it
+       is full the state that was added first is forgotten. Forgetting a
+       state never prunes a state wrongly, it can only cause a state to be
+       reached (and expanded) again.'''
+
+    def __init__(self, max_size):
+        OrderedDict.__init__(self)
+        self.max_size = max_size
+        self.evicted = 0
+
+    def __setitem__(self, key, value):
+        OrderedDict.__setitem__(self, key, value)
+        if len(self) > self.max_size:
+            self.popitem(last=False)
+            self.evicted = self.evicted + 1
+
+class CachedHeuristic:
+    '''Wraps a heuristic function heur_fn, remembering the value computed
+       for a state so that when the same state is reached again (via a
+       different path) the value is looked up instead of recomputed.
+
+       key is 'hash' (state.hashable_state()), 'compact'
+       (state.compact_state()) or a function of the state. A key that
+       leaves part of the state out (e.g., sokoban_box_key, which only
+       looks at the boxes) may only be used with a heuristic that ignores
+       that part. Heuristics that store something on the state they are
+       called on (e.g., heur_min_matching) still work, but only for the
+       states they are actually called on.
+
+       At most max_size values are kept (None for no limit). When the
+       cache is full a value is evicted according to policy:
+         'lru'   -- the least recently used value
+         'clock' -- the CLOCK approximation of LRU: a hand sweeps over the
+                    values, evicting the first one that has not been used
+                    since the hand last passed it (cheaper per hit, no
+                    reordering).
+       hits, misses and evictions count the lookups.'''
+
+    def __init__(self, heur_fn, max_size = 100000, key = 'hash', policy = 'lru'):
+        self.heur_fn = heur_fn
+        self.key = _CC_KEYS[key] if key in _CC_KEYS else key
+        self.max_size = max_size
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.clear()
+        if max_size is None:
+            self.lookup = self._lookup_unbounded
+        elif policy == 'lru':
+            self.lookup = self._lookup_lru
+        else:
+            self.lookup = self._lookup_clock
+
+    def clear(self):
+        '''Forget all values (the counts are kept)'''
+        self.values = OrderedDict() if self.policy == 'lru' else {}
+        #CLOCK: the key in each slot and whether it was used since the
+        #hand last passed it
+        self.slot_keys = []
+        self.referenced = bytearray()
+        self.hand = 0
+
+    def __len__(self): return len(self.values)
+
+    def __call__(self, state):
+        return self.lookup(self.key(state), state)
+
+    def _lookup_unbounded(self, key, state):
+        value = self.values.get(key)
+        if value is None:
+            self.misses = self.misses + 1
+            value = self.values[key] = self.heur_fn(state)
+        else:
+            self.hits = self.hits + 1
+        return value
+
+    def _lookup_lru(self, key, state):
+        values = self.values
+        value = values.get(key)
+        if value is not None:
+            self.hits = self.hits + 1
+            values.move_to_end(key)
+            return value
+        self.misses = self.misses + 1
+        value = values[key] = self.heur_fn(state)
+        if len(values) > self.max_size:
+            values.popitem(last=False)
+            self.evictions = self.evictions + 1
+        return value
+
+    def _lookup_clock(self, key, state):
+        #values maps each key to (value, slot)
+        entry = self.values.get(key)
+        if entry is not None:
+            self.hits = self.hits + 1
+            self.referenced[entry[1]] = 1
+            return entry[0]
+        self.misses = self.misses + 1
+        value = self.heur_fn(state)
+        slot_keys = self.slot_keys
+        if len(slot_keys) < self.max_size:
+            slot = len(slot_keys)
+            slot_keys.append(key)
+            self.referenced.append(0)
+        else:
+            referenced = self.referenced
+            while referenced[self.hand]:
+                referenced[self.hand] = 0
+                self.hand = (self.hand + 1) % self.max_size
+            slot = self.hand
+            self.hand = (slot + 1) % self.max_size
+            del self.values[slot_keys[slot]]
+            self.evictions = self.evictions + 1
+            slot_keys[slot] = key
+        self.values[key] = (value, slot)
+        return value
+
+class SearchStats:
+    '''Statistics of a search, SearchEngine.search leaves them in the
+       engine's stats attribute. The counts and times are totals since
+       init_search (an anytime search calls search several times):
+         nodes_expanded, states_generated
+         cycle_check_pruned, cost_bound_pruned, cc_evicted
+         stale_skipped    -- nodes taken from OPEN and dropped because a
+                             cheaper path to their state had been found
+                             after they were put on OPEN
+         prune_counts     -- for each pruning function (see
+                             SearchEngine.add_prune_fn) the states it pruned
+         heur_evaluations -- calls of heur_fn made by the search (0 for
+                             bidirectional search, which uses no heuristic)
+         heur_cache_hits, heur_cache_misses -- lookups in the heuristic
+                            cache; None unless the cache was on.
+         peak_open_size  -- largest size of OPEN (for idastar the largest
+                            depth of the search stack, for bidirectional
+                            search the two OPENs together)
+         open_size       -- size of OPEN (stale nodes included) at the end
+                            of the search (0 for idastar and bidirectional)
+         open_backend    -- how OPEN was kept (see set_open_backend):
+                            'heap', 'indexed', 'bucket' or 'bucket, then
+                            heap' if a BucketOpen fell back to a heap
+         open_decreased  -- nodes on OPEN replaced by a node for the same
+                            state reached via a cheaper path; None unless
+                            OPEN was an IndexedOpen (see set_open_backend)
+         closed_set_size -- states in the closed set (0 if there is none)
+         search_time     -- wall-clock seconds spent in search
+         timed_out       -- True if the last call of search stopped at its
+                            time bound (or was cancelled)
+         expansions_per_second
+         successor_time, heur_time, goal_time -- seconds spent in
+                            successors() (and predecessors()), heur_fn and
+                            goal_fn; None unless profiling was on.'''
+
+    def __init__(self, engine):
+        self.nodes_expanded = engine.nodes_expanded
+        self.states_generated = engine.states_generated
+        self.cycle_check_pruned = engine.cycle_check_pruned
+        self.cost_bound_pruned = engine.cost_bound_pruned
+        self.stale_skipped = engine.stale_skipped
+        self.prune_counts = dict(engine.prune_counts)
+        self.heur_evaluations = engine.heur_evaluations
+        self.cc_evicted = engine.cc_evicted
+        self.peak_open_size = engine.peak_open_size
+        self.open_size = len(engine.open) if engine.open is not None else 0
+        self.open_decreased = None
+        self.open_backend = 'heap'
+        if isinstance(engine.open, IndexedOpen):
+            self.open_decreased = engine.open.decreased
+            self.open_backend = 'indexed'
+        elif isinstance(engine.open, BucketOpen):
+            self.open_backend = 'bucket, then heap' if engine.open.fallback else 'bucket'
+        self.closed_set_size = engine.closed_set_size()
+        self.search_time = engine.search_time
+        self.timed_out = engine.timed_out
+        if self.search_time > 0:
+            self.expansions_per_second = self.nodes_expanded/self.search_time
+        else:
+            self.expansions_per_second = 0.0
+        self.heur_cache_hits = self.heur_cache_misses = None
+        if engine.heur_cache is not None:
+            self.heur_cache_hits = engine.heur_cache.hits
+            self.heur_cache_misses = engine.heur_cache.misses
+        self.successor_time = self.heur_time = self.goal_time = None
+        if engine.profile:
+            self.successor_time = engine.successor_time
+            self.heur_time = engine.heur_time
+            self.goal_time = engine.goal_time
+
+    def __str__(self):
+        s = ("Nodes expanded = {}, states generated = {}, states cycle check pruned = {}, states cost bound pruned = {}\n"
+             "Heuristic evaluations = {}, peak OPEN size = {}, closed set size = {}, search time = {:.3f} sec, expansions/sec = {:.1f}").format(
+                 self.nodes_expanded, self.states_generated, self.cycle_check_pruned, self.cost_bound_pruned,
+                 self.heur_evaluations, self.peak_open_size, self.closed_set_size, self.search_time, self.expansions_per_second)
+        if self.timed_out:
+            s = s + " (stopped at the time bound)"
+        s = s + "\nOPEN ({}) size = {}, stale nodes skipped = {}".format(self.open_backend, self.open_size, self.stale_skipped)
+        if self.open_decreased is not None:
+            s = s + ", nodes replaced on OPEN = {}".format(self.open_decreased)
+        if self.prune_counts:
+            s = s + "\nStates pruned: " + ", ".join(
+                "{} = {}".format(name, count) for name, count in self.prune_counts.items())
+        if self.heur_cache_hits is not None:
+            s = s + "\nHeuristic cache hits = {}, misses = {}".format(self.heur_cache_hits, self.heur_cache_misses)
+        if self.successor_time is not None:
+            s = s + "\nTime in successors = {:.3f} sec, heur_fn = {:.3f} sec, goal_fn = {:.3f} sec".format(
+                self.successor_time, self.heur_time, self.goal_time)
+        return s
+
+class SearchEngine:
+    def __init__(self, strategy = 'depth_first', cc_level = 'default'):
+        self.set_strategy(strategy, cc_level)
+        self.trace_off()
+        self.trace_sink = print_trace
+        self.profile = False
+        self.prune_fns = []
+        self.heuristic_cache_off()
+        self.heur_cache = None
+        self.set_deferred_evaluation(False)
+        self.set_compact_trace(False)
+        self.set_open_backend('heap')
+        self.set_closed_set()
+        self.set_clock()
+        self.stats = None
+        self.timed_out = False
+
+    def initStats(self):
+        #statistics are kept per engine so that several engines can
+        #search at the same time (e.g., in different threads)
+        self.nodes_expanded = 0
+        self.states_generated = 1    #initial state already generated on call so search
+        self.cycle_check_pruned = 0
+        self.cost_bound_pruned = 0
+        self.stale_skipped = 0
+        self.prune_counts = dict((name, 0) for name, _ in self.prune_fns)
+        self.heur_evaluations = 0
+        self.cc_evicted = 0
+        self.peak_open_size = 1
+        self.search_time = 0.0
+        self.successor_time = 0.0
+        self.heur_time = 0.0
+        self.goal_time = 0.0
+
+    def closed_set_size(self):
+        '''Number of states currently held in the closed set(s)'''
+        if self.strategy == _BIDIRECTIONAL:
+            return len(self.forward_states) + len(self.backward_states)
+        if self.cycle_check == _CC_FULL:
+            return len(self.cc_dictionary)
+        return 0
+
+    def set_clock(self, clock = 'wall', check_every = 64):
+        '''Set how search measures a numeric timebound: on the clock
+           'wall' (wall-clock time) or 'cpu' (process cpu time), reading
+           the clock once every check_every expansions.'''
+        if not clock in _CLOCKS:
+            print('Unknown clock', clock)
+            print("Must be one of", list(_CLOCKS))
+        else:
+            self.clock = clock
+            self.check_every = check_every
+
+    def profile_on(self):
+        '''Measure the time spent in successors(), heur_fn and goal_fn
+           (reported in self.stats). Takes effect at the next init_search.'''
+        self.profile = True
+
+    def profile_off(self):
+        '''Stop measuring the time spent in successors(), heur_fn and goal_fn'''
+        self.profile = False
+
+    def heuristic_cache_on(self, max_size = 100000, key = 'hash', policy = 'lru'):
+        '''Cache the values of the heuristic function in searches started
+           after this call, see CachedHeuristic for the parameters. The cache
+           of the last search is left in self.heur_cache.'''
+        if not policy in ['lru', 'clock']:
+            print('Unknown heuristic cache policy', policy)
+            print("Must be one of ['lru', 'clock']")
+        elif not (key in _CC_KEYS or callable(key)):
+            print('Unknown heuristic cache key', key)
+            print("Must be one of", list(_CC_KEYS), "or a function of the state")
+        elif max_size is not None and max_size < 1:
+            print('Heuristic cache size must be at least 1, not', max_size)
+        else:
+            self.heur_cache_config = (max_size, key, policy)
+
+    def heuristic_cache_off(self):
+        self.heur_cache_config = None
+
+    def _timed(self, fn, total):
+        '''Return fn wrapped so that the time spent in it is added to the
+           attribute of self named total'''
+        perf_counter = time.perf_counter
+        def timed(arg):
+            start = perf_counter()
+            result = fn(arg)
+            setattr(self, total, getattr(self, total) + perf_counter() - start)
+            return result
+        return timed
+
+    def set_deferred_evaluation(self, deferred = True, iter_successors = False):
+        '''Deferred (lazy) heuristic evaluation: successors are put on OPEN
+           with the hval of their parent and their own hval is only computed
+           when they are extracted, so successors that are never extracted
+           are never evaluated. For best_first search (lazy greedy best first
+           search) the node is then expanded straight away; for the other
+           strategies it is put back on OPEN if its new key makes it no longer
+           the first node. The hval and f-value parts of a costbound are
+           checked once the node has been evaluated.
+
+           With iter_successors the successors of a node are generated one at
+           a time by the state's iter_successors method (unless profiling).
+
+           Only applies to the strategies that use OPEN (not idastar,
+           bidirectional or ARAStarEngine).'''
+        self.deferred = deferred
+        self.iter_successors = iter_successors
+
+    def set_open_backend(self, backend = 'heap'):
+        '''Set how OPEN is kept by the priority queue strategies (ucs,
+           best_first, astar, custom and ARAStarEngine): 'heap' (the
+           default: Open, a binary heap that may hold stale nodes, which
+           are skipped when extracted), 'indexed' (IndexedOpen, which holds
+           one node per state and replaces it when a cheaper path is
+           found), 'bucket' (BucketOpen, a bucket queue for integer keys,
+           which moves its nodes to a heap if it gets a key that is not
+           one) or 'auto' ('bucket' for ucs, best_first and astar if the
+           gval and hval of the initial state are integers, otherwise
+           'heap'). 'indexed' and 'bucket' break ties on the key first in
+           first out rather than in heap order, so they can expand the
+           nodes in a different order than 'heap' and take longer to
+           reach a goal.
+           'indexed' needs full cycle checking, its nodes are indexed by the
+           closed set key. The custom strategy does not use 'bucket', and
+           ARAStarEngine only takes 'heap' and 'indexed'.
+           Takes effect at the next init_search.'''
+        if not backend in ['auto', 'heap', 'indexed', 'bucket']:
+            print('Unknown OPEN backend', backend)
+            print("Must be one of ['auto', 'heap', 'indexed', 'bucket']")
+        else:
+            self.open_backend = backend
+
+    def set_compact_trace(self, compact = True):
+        '''Compact trace mode, for long searches that run out of memory. The
+           states a search has expanded are normally kept alive by the
+           parent pointers of their successors. In this mode each expanded
+           node is recorded in a trace table instead (two arrays, the slot
+           of its parent and a code for its action) and its successors are
+           put on OPEN without a parent, so an expanded state is freed once
+           its successors are on OPEN. When a goal is found the path to it
+           is rebuilt by replaying the actions from the initial state, so
+           the state returned by search has its parents as usual (and
+           print_path works). This needs successors() to be deterministic
+           and to give the successors of a state different actions.
+
+           Applies to the strategies that use OPEN, with full or no cycle
+           checking (path checking needs the parents). The memory used by
+           the closed set itself can be reduced with set_closed_set('compact').
+           Takes effect at the next init_search.'''
+        self.compact_trace = compact
+
+    def _record_expansion(self, node):
+        '''Compact trace mode: add node to the trace table, returns its slot'''
+        action = node.state.action
+        code = self.action_codes.get(action)
+        if code is None:
+            code = self.action_codes[action] = len(self.action_names)
+            self.action_names.append(action)
+        self.trace_parents.append(-1 if node.parent_slot is None else node.parent_slot)
+        self.trace_actions.append(code)
+        return len(self.trace_parents) - 1
+
+    def _rebuild_path(self, node):
+        '''Compact trace mode: return the state of node with the path to it,
+           rebuilt from the trace table by replaying the actions from the
+           initial state'''
+        slot = node.parent_slot
+        if slot is None:
+            return node.state
+        actions = [node.state.action]
+        while self.trace_parents[slot] != -1:
+            actions.append(self.action_names[self.trace_actions[slot]])
+            slot = self.trace_parents[slot]
+        state = self.init_state
+        for action in reversed(actions):
+            state = next((succ for succ in state.successors() if succ.action == action), None)
+            if state is None:
+                print("ERROR: Could not replay the path to the goal, no successor with action", action)
+                return node.state
+        if state.hashable_state() != node.state.hashable_state():
+            print("ERROR: The path replayed does not end in the goal state")
+            return node.state
+        return state
+
+    def add_prune_fn(self, prune_fn, name = None):
+        '''Add a pruning function, called on each successor that passed
+           cycle checking (before its heuristic is computed) by the searches
+           that use OPEN and by ARAStarEngine (not by idastar or
+           bidirectional search). If prune_fn(state) returns True the state is a
+           dead end (e.g., a deadlock) and is not put on OPEN. The states
+           pruned by each function are counted in the search statistics
+           under name (by default the function's name).'''
+        if name is None:
+            name = getattr(prune_fn, '__name__', str(prune_fn))
+        self.prune_fns.append((name, prune_fn))
+
+    def clear_prune_fns(self):
+        self.prune_fns = []
+
+    def _prune(self, state):
+        '''Apply the pruning functions, returns the name of the one that
+           prunes state (None if none does)'''
+        for name, prune_fn in self.prune_fns:
+            if prune_fn(state):
+                self.prune_counts[name] = self.prune_counts.get(name, 0) + 1
+                return name
+        return None
+
+    def trace_on(self, level = 1, sink = None):
+        '''For debugging, set tracking level 1 or 2. The trace messages are
+           sent to sink (see print_trace and TraceBuffer), by default they
+           are printed. Searches started with tracing off run a loop with no
+           tracing code at all; turning tracing on or off takes effect at
+           the next call of search.'''
+        self.trace = level
+        self.trace_sink = print_trace if sink is None else sink
+
+    def _trace(self, message):
+        self.trace_sink(message)
+
+    def trace_off(self):
+        '''Turn off tracing'''
+        self.trace = 0
+
+    def set_closed_set(self, key = 'hash', max_size = None):
+        '''Configure the closed set used by full cycle checking.
+           key is 'hash' to store state.hashable_state(), 'compact' to
+           store state.compact_state(), 'canonical' to store
+           state.canonical_state() or a function of the state that returns
+           the key to store. Keys other than 'hash' and 'compact' may merge
+           different states (see StateSpace.canonical_state), in which case
+           the search is no longer guaranteed to find an optimal solution;
+           keep the default 'hash' when that guarantee is needed.
+           If max_size is given at most max_size states are remembered (the
+           oldest are forgotten first); the keys stored are always exact, so
+           no state is ever pruned because of a collision.'''
+        if not (key in _CC_KEYS or callable(key)):
+            print('Unknown closed set key', key)
+            print("Must be one of", list(_CC_KEYS), "or a function of the state")
+        elif max_size is not None and max_size < 1:
+            print('Closed set size must be at least 1, not', max_size)
+        else:
+            self.cc_key = key
+            self.cc_max_size = max_size
+
+    def set_strategy(self, s, cc = 'default'):
+        '''Set the search strategy and the cycle checking level. For
+           'idastar' (iterative deepening A*) 'full' cycle checking means
+           path checking plus a transposition table, which remembers the
+           states visited in the current iteration; its size can be
+           bounded with set_closed_set.
+           'bidirectional' (uniform cost search from the initial state and,
+           backwards, from the goal states at the same time) always
+           remembers all states reached in both directions, so the cycle
+           checking level does not apply to it.'''
+        if not s in ['depth_first', 'breadth_first', 'ucs', 'best_first', 'astar', 'custom', 'idastar', 'bidirectional']:
+            print('Unknown search strategy specified:', s)
+            print("Must be one of 'depth_first', 'ucs', 'breadth_first', 'best_first', 'custom', 'astar', 'idastar' or 'bidirectional'")
+        elif not cc in ['default', 'none', 'path', 'full']:
+            print('Unknown cycle check level', cc)
+            print( "Must be one of ['default', 'none', 'path', 'full']")
+
+        else:
+            if cc == 'default' :
+                if s == 'depth_first' or s == 'idastar' :
+                    self.cycle_check = _CC_PATH
+                else:
+                    self.cycle_check = _CC_FULL
+            elif cc == 'none': self.cycle_check = _CC_NONE
+            elif cc == 'path': self.cycle_check = _CC_PATH
+            elif cc == 'full': self.cycle_check = _CC_FULL
+
+            if   s == 'depth_first'  : self.strategy = _DEPTH_FIRST
+            elif s == 'breadth_first': self.strategy = _BREADTH_FIRST
+            elif s == 'ucs' : self.strategy = _UCS               
+            elif s == 'best_first'   : self.strategy = _BEST_FIRST
+            elif s == 'astar'        : self.strategy = _ASTAR       
+            elif s == 'custom' : self.strategy = _CUSTOM             
+            elif s == 'idastar'      : self.strategy = _IDASTAR
+            elif s == 'bidirectional': self.strategy = _BIDIRECTIONAL
+
+    def get_strategy(self):
+        if   self.strategy == _DEPTH_FIRST    : rval = 'depth_first'
+        elif self.strategy == _BREADTH_FIRST  : rval = 'breadth_first'
+        elif self.strategy == _BEST_FIRST     : rval = 'best_first' 
+        elif self.strategy == _UCS          : rval = 'ucs' 
+        elif self.strategy == _ASTAR          : rval = 'astar'      
+        elif self.strategy == _CUSTOM          : rval = 'custom'   
+        elif self.strategy == _IDASTAR        : rval = 'idastar'
+        elif self.strategy == _BIDIRECTIONAL  : rval = 'bidirectional'
+  
+        rval = rval + ' with '
+
+        if   self.cycle_check == _CC_NONE : rval = rval + 'no cycle checking'
+        elif self.cycle_check == _CC_PATH : rval = rval + 'path checking'
+        elif self.cycle_check == _CC_FULL : rval = rval + 'full cycle checking'
+
+        return rval
+
+    def init_search(self, initState, goal_fn, heur_fn=_zero_hfn, fval_function=_fval_function, goal_states=None):
+        """
+        Get ready to search. Call search on this object to run the search.
+
+        @param initState: the state of the puzzle to start the search from.
+        @param goal_fn: the goal function for the puzzle
+        @param heur_fn: the heuristic function to use (only relevant for search strategies that use heuristics)
+        @param fval_fn: the f-value function (only relevant for custom search strategy)
+        @param goal_states: all the goal states, with gval 0 (only relevant for bidirectional search;
+                            the states must implement predecessors)
+        """
+        #Perform full cycle checking as follows
+        #a. check state before inserting into OPEN. If we had already reached
+        #   the same state via a cheaper path, don't insert into OPEN.
+        #b. Sometimes we find a new cheaper path to a state (after the older
+        #   more expensive path to the state has already been inserted.
+        #   We deal with this lazily. We check states extracted from OPEN
+        #   and if we have already expanded that state via a cheaper path
+        #   we don't expand it. If we had expanded the state via a more
+        #   expensive path, we re-expand it.
+        
+        self.initStats()
+        self.successors_fn = _successors
+        self.predecessors_fn = _predecessors
+        self.heur_cache = None
+        if self.heur_cache_config is not None:
+            heur_fn = self.heur_cache = CachedHeuristic(heur_fn, *self.heur_cache_config)
+        if self.profile:
+            goal_fn = self._timed(goal_fn, 'goal_time')
+            heur_fn = self._timed(heur_fn, 'heur_time')
+            self.successors_fn = self._timed(_successors, 'successor_time')
+            self.predecessors_fn = self._timed(_predecessors, 'successor_time')
+
+        #BEGIN TRACING
+        if self.trace:
+            self._trace("Search Strategy: " + self.get_strategy())
+            self._trace("Initial State:" + _printed(initState.print_state))
+        #END TRACING
+        node = sNode(initState, heur_fn(initState), fval_function)      
+
+        #the cycle check dictionary stores the cheapest path (g-val) found
+        #so far to a state. 
+        self.state_key = _CC_KEYS[self.cc_key] if self.cc_key in _CC_KEYS else self.cc_key
+        if self.cycle_check == _CC_FULL:
+            if self.cc_max_size is None:
+                self.cc_dictionary = dict()
+            else:
+                self.cc_dictionary = _BoundedClosedSet(self.cc_max_size)
+            self.cc_dictionary[self.state_key(initState)] = initState.gval
+        
+        if self.strategy == _IDASTAR:
+            #IDA* keeps no OPEN, its depth first search is resumed by search()
+            self.open = None
+            self.ida_search = self._searchIDA(node, goal_fn, heur_fn, fval_function)
+        elif self.strategy == _BIDIRECTIONAL:
+            if not goal_states:
+                print("Bidirectional search needs the list of goal states")
+                goal_states = []
+            self.open = None
+            self.bidirectional_search = self._searchBidirectional(initState, goal_states, fval_function)
+        elif self.open_backend == 'indexed' and not self.strategy in (_DEPTH_FIRST, _BREADTH_FIRST):
+            if self.cycle_check != _CC_FULL:
+                print("The indexed OPEN needs full cycle checking, using a heap")
+                self.open = Open(self.strategy, fval_function)
+            else:
+                self.open = IndexedOpen(self.strategy, fval_function, self.state_key)
+            self.open.insert(node)
+        elif self.strategy in (_UCS, _BEST_FIRST, _ASTAR) and (
+                self.open_backend == 'bucket' or
+                self.open_backend == 'auto' and _integral(node.gval) and _integral(node.hval)):
+            self.open = BucketOpen(self.strategy, fval_function)
+            self.open.insert(node)
+        else:
+            self.open = Open(self.strategy, fval_function)
+            self.open.insert(node)
+        #depth first search with path checking keeps the path to the node
+        #it expands (see _enter_path)
+        self.path = []
+        self.on_path = set()
+        self.compact = False
+        if self.compact_trace:
+            if self.open is None or self.cycle_check == _CC_PATH:
+                print("The compact trace mode needs a strategy that uses OPEN, without path checking")
+            else:
+                self.compact = True
+                self.init_state = initState
+                self.trace_parents = array('i')
+                self.trace_actions = array('I')
+                self.action_codes = dict()
+                self.action_names = []
+        #the costbound OPEN was last pruned with (see search)
+        self.open_costbound = None
+        self.fval_function = fval_function
+        self.goal_fn = goal_fn
+        self.heur_fn = heur_fn
+
+    def search(self, timebound=None, costbound=None):
+        """
+        Start searching, using the parameters set by init_search.
+
+        @param timebound: the maximum amount of time, in seconds, to spend on this search
+                          (measured as set by set_clock), or a Deadline.
+        @param costbound: the cost bound 3-tuple for pruning, as specified in the assignment.
+
+        search can be called again on the same engine to resume the search
+        after it returns a goal (or runs out of time), e.g., with a tighter
+        costbound once a solution is known. OPEN and the cycle check
+        dictionary are kept between the calls: when the costbound changes the
+        nodes on OPEN that are over the new bound are removed in one pass,
+        and the g-values in the cycle check dictionary remain valid (a state
+        is only re-opened when it is reached via a cheaper path, and as
+        long as the costbound only gets tighter a path that is no cheaper
+        than one already recorded is over the bound whenever the recorded one
+        is). A costbound that is looser than an earlier one does not bring
+        back nodes that earlier calls have pruned.
+        """
+
+        goal_node = []
+
+        ###NOW do the search and return the result
+        wall_start_time = time.perf_counter()
+        self.timed_out = False
+        if isinstance(timebound, Deadline):
+            self.deadline = timebound
+        else:
+            self.deadline = Deadline(timebound or None, self.clock, self.check_every)
+        if self.strategy == _IDASTAR:
+            self.costbound = costbound
+            goal_node = next(self.ida_search, False)
+        elif self.strategy == _BIDIRECTIONAL:
+            goal_node = next(self.bidirectional_search, False)
+        else:
+            if costbound is not None and costbound != self.open_costbound:
+                self.prune_open(costbound)
+            #the tracing is in a separate copy of the search loop, so that
+            #searching without it does not test for it on every step
+            search_open = self._searchOpenTraced if self.trace else self._searchOpen
+            goal_node = search_open(self.goal_fn, self.heur_fn, self.fval_function, costbound)
+        if self.cycle_check == _CC_FULL and self.cc_max_size is not None:
+            self.cc_evicted = self.cc_dictionary.evicted
+        self.search_time = self.search_time + time.perf_counter() - wall_start_time
+        self.stats = SearchStats(self)
+
+        if goal_node:
+            #print("Solution Found with cost of {} in search time of {} sec".format(goal_node.gval, self.search_time))
+            #print(self.stats)
+            if self.compact:
+                return self._rebuild_path(goal_node)
+            return goal_node.state
+        else:
+            #exited the while without finding goal---search failed
+            #print("Search Failed! No solution found.")
+            #print(self.stats)
+            return False
+
+    def prune_open(self, costbound):
+        '''Remove the nodes on OPEN that are over the cost bound 3-tuple
+           costbound (counted as cost bound pruned)'''
+        gbound, hbound, fbound = costbound
+        #the hval of a deferred node is not its own, only its gval can be checked
+        pruned = self.open.prune(lambda node: node.gval <= gbound and
+                                              (node.deferred or
+                                               node.hval <= hbound and
+                                               node.gval + node.hval <= fbound))
+        self.cost_bound_pruned = self.cost_bound_pruned + pruned
+        self.open_costbound = costbound
+        #BEGIN TRACING
+        if self.trace:
+            self._trace("Pruned {} nodes from OPEN over the cost bound {}".format(pruned, costbound))
+        #END TRACING
+
+    def set_fval_function(self, fval_function):
+        '''Change the f-value function of a custom search that is under way
+           (e.g., to lower the weight of weighted A* after a solution has been
+           found). The nodes on OPEN are re-ordered by the new f-values and
+           the next call to search continues from them, so the states already
+           expanded are not expanded again unless they are reached via a
+           cheaper path.'''
+        self.fval_function = fval_function
+        if self.open is not None:
+            self.open.rekey(fval_function)
+
+    def _enter_path(self, state):
+        '''Depth first search with path checking: make self.path the path to
+           state, the node being expanded. Every node on OPEN is a child of
+           a state on the path, so state's parent is on it and the states
+           after the parent are dropped before state is added. The hashable
+           states of the path are kept in self.on_path, so checking a
+           successor for a cycle is a set lookup instead of the walk of
+           has_path_cycle.'''
+        path = self.path
+        while path and path[-1][0] is not state.parent:
+            self.on_path.discard(path.pop()[1])
+        key = state.hashable_state()
+        path.append((state, key))
+        self.on_path.add(key)
+
+    def _searchOpen(self, goal_fn, heur_fn, fval_function, costbound):
+        """
+        Search, starting from self.open.
+
+        @param goal_fn: the goal function.
+        @param heur_fn: the heuristic function.
+        @param fval_function: the f-value function (only relevant when using a custom search strategy).
+        @param costbound: the cost bound 3-tuple, as described in the assignment.
+
+        This is the loop used when tracing is off, _searchOpenTraced is the
+        same search with tracing. A change to one must be made to both.
+        """
+        if self.iter_successors and not self.profile:
+            expand = _iter_successors
+        else:
+            expand = self.successors_fn
+        search_open = self.open
+        full_cc = self.cycle_check == _CC_FULL
+        path_cc = self.cycle_check == _CC_PATH
+        dfs_path = path_cc and self.strategy == _DEPTH_FIRST
+        on_path = self.on_path
+        #path checking compares the states themselves
+        state_key = self.state_key if full_cc else _CC_KEYS['hash']
+        cc_dictionary = self.cc_dictionary if full_cc else None
+        deferred = self.deferred
+        requeue = self.strategy != _BEST_FIRST
+        prune_fns = self.prune_fns
+        compact = self.compact
+        deadline = self.deadline
+        while not search_open.empty():
+            node = search_open.extract()
+
+            if goal_fn(node.state):
+              #node at front of OPEN is a goal...search is completed.
+              return node
+
+            if deadline.expired(): #timebound check
+                #exceeded time bound (or cancelled), must terminate search.
+                #Put the node back so that a later search call resumes with it
+                search_open.putback(node)
+                self.timed_out = True
+                return False
+
+            #only expand the node if no cheaper path to its state has
+            #been found since it was put on OPEN (see _searchOpenTraced)
+            if full_cc and cc_dictionary.get(state_key(node.state), node.gval) < node.gval:
+                self.stale_skipped = self.stale_skipped + 1
+                continue
+
+            if node.deferred:
+                #deferred evaluation: compute the node's own hval now
+                node.deferred = False
+                node.hval = heur_fn(node.state)
+                self.heur_evaluations = self.heur_evaluations + 1
+                if costbound is not None and (node.hval > costbound[1] or
+                                              node.gval + node.hval > costbound[2]):
+                    self.cost_bound_pruned = self.cost_bound_pruned + 1
+                    continue
+                if requeue and search_open.requeue(node):
+                    continue
+
+            if dfs_path:
+                self._enter_path(node.state)
+            if compact:
+                slot = self._record_expansion(node)
+
+            successors = expand(node.state)
+            self.nodes_expanded = self.nodes_expanded + 1
+            generated = 0
+
+            for succ in successors:
+                generated = generated + 1
+                hash_state = state_key(succ)
+
+                if (full_cc and hash_state in cc_dictionary and succ.gval > cc_dictionary[hash_state]
+                    ) or (path_cc and (hash_state in on_path if dfs_path else succ.has_path_cycle())):
+                    self.cycle_check_pruned = self.cycle_check_pruned + 1
+                    continue
+
+                if prune_fns and self._prune(succ) is not None:
+                    #dead state, never to be reached again via a path that
+                    #is no cheaper
+                    if full_cc:
+                        cc_dictionary[hash_state] = succ.gval
+                    continue
+
+                if deferred:
+                    #evaluated when extracted, only the gval can be checked now
+                    succ_hval = node.hval
+                    over_bound = costbound is not None and succ.gval > costbound[0]
+                else:
+                    succ_hval = heur_fn(succ)
+                    self.heur_evaluations = self.heur_evaluations + 1
+                    over_bound = costbound is not None and (succ.gval > costbound[0] or
+                                                            succ_hval > costbound[1] or
+                                                            succ.gval + succ_hval > costbound[2])
+                if over_bound:
+                    self.cost_bound_pruned = self.cost_bound_pruned + 1
+                    continue
+
+                #passed all cycle checks and costbound checks ...add to open
+                child = sNode(succ, succ_hval, fval_function, deferred)
+                if compact:
+                    #the trace table holds the path, free the parent
+                    child.parent_slot = slot
+                    succ.parent = None
+                search_open.insert(child)
+
+                #record cost of this path in dictionary.
+                if full_cc:
+                    cc_dictionary[hash_state] = succ.gval
+
+            self.states_generated = self.states_generated + generated
+            if len(search_open) > self.peak_open_size:
+                self.peak_open_size = len(search_open)
+
+        #end of while--OPEN is empty and no solution
+        return False
+
+    def _searchOpenTraced(self, goal_fn, heur_fn, fval_function, costbound):
+        """
+        _searchOpen with tracing, sending the trace messages to
+        self.trace_sink. Used by search when tracing is on.
+        """
+
+        #BEGIN TRACING
+        self._trace("Initial OPEN: " + _printed(self.open.print_open))
+        if self.cycle_check == _CC_FULL:
+            self._trace("Initial CC_Dict: {}".format(self.cc_dictionary))
+        #END TRACING
+        state_key = self.state_key if self.cycle_check == _CC_FULL else _CC_KEYS['hash']
+        if self.iter_successors and not self.profile:
+            expand = _iter_successors
+        else:
+            expand = self.successors_fn
+        dfs_path = self.cycle_check == _CC_PATH and self.strategy == _DEPTH_FIRST
+        while not self.open.empty():
+            node = self.open.extract()
+
+            #BEGIN TRACING
+            self._trace("Next State to expand: <S{}:{}:{}, g={}, h={}, f=g+h={}>".format(
+                node.state.index, node.state.action, node.state.hashable_state(), node.gval, node.hval, node.gval + node.hval))
+            #END TRACING
+                        
+            if goal_fn(node.state):
+              #node at front of OPEN is a goal...search is completed.
+              return node
+
+            if self.deadline.expired(): #timebound check
+                #exceeded time bound (or cancelled), must terminate search.
+                #Put the node back so that a later search call resumes with it
+                self.open.putback(node)
+                self.timed_out = True
+                self._trace("Search has exceeded the time bound provided.")
+                return False
+
+             #All states reached by a search node on OPEN have already
+             #been hashed into the self.cc_dictionary. However,
+             #before expanding a node we might have already expanded
+             #an equivalent state with lower g-value. So only expand
+             #the node if the hashed g-value is no greater than the
+             #node's current g-value. 
+
+            #BEGIN TRACING
+            if self.cycle_check == _CC_FULL:
+                self._trace("CC_dict gval={}, node.gval={}".format(
+                    self.cc_dictionary.get(state_key(node.state)), node.gval))
+            #END TRACING
+
+            if self.cycle_check == _CC_FULL and self.cc_dictionary.get(state_key(node.state), node.gval) < node.gval:
+                self.stale_skipped = self.stale_skipped + 1
+                continue
+
+            if node.deferred:
+                #deferred evaluation: the node was put on OPEN with its
+                #parent's hval, compute its own now
+                node.deferred = False
+                node.hval = heur_fn(node.state)
+                self.heur_evaluations = self.heur_evaluations + 1
+                if costbound is not None and (node.hval > costbound[1] or
+                                              node.gval + node.hval > costbound[2]):
+                    self.cost_bound_pruned = self.cost_bound_pruned + 1
+                    continue
+                #greedy best first search expands the node anyway, the other
+                #strategies first check that it is still first on OPEN
+                if self.strategy != _BEST_FIRST and self.open.requeue(node):
+                    continue
+
+            if dfs_path:
+                self._enter_path(node.state)
+            if self.compact:
+                slot = self._record_expansion(node)
+
+            successors = expand(node.state)
+            self.nodes_expanded = self.nodes_expanded + 1
+            generated = 0
+
+            #BEGIN TRACING
+            #the heuristic is only evaluated below, on the successors that
+            #survive the pruning (as in _searchOpen), so only g is shown here
+            successors = list(successors)
+            self._trace("Expanding Node. Successors = {" + "".join(
+                "<S{}:{}:{}, g={}>, ".format(ss.index, ss.action, ss.hashable_state(), ss.gval)
+                for ss in successors) + "}")
+            #END TRACING
+
+            for succ in successors:
+                generated = generated + 1
+                hash_state = state_key(succ)
+
+                #BEGIN TRACING
+                if self.trace > 1:
+                    self._trace("Successor State:" + _printed(succ.print_state))
+
+                    if self.cycle_check == _CC_FULL and hash_state in self.cc_dictionary:
+                        self._trace("Already in CC_dict, CC_dict gval={}, successor state gval={}".format(
+                            self.cc_dictionary[hash_state], succ.gval))
+
+                    if self.cycle_check == _CC_PATH and (hash_state in self.on_path if dfs_path
+                                                         else succ.has_path_cycle()):
+                        self._trace("On cyclic path")
+                #END TRACING
+
+                prune_succ = (self.cycle_check == _CC_FULL and
+                              hash_state in self.cc_dictionary and
+                              succ.gval > self.cc_dictionary[hash_state]
+                             ) or (
+                              self.cycle_check == _CC_PATH and
+                              (hash_state in self.on_path if dfs_path else succ.has_path_cycle())
+                             )
+
+                if prune_succ :
+                    self.cycle_check_pruned = self.cycle_check_pruned + 1
+                    #BEGIN TRACING
+                    if self.trace > 1:
+                        self._trace("Successor State pruned by cycle checking")
+                    #END TRACING
+                    continue
+
+                pruned_by = self._prune(succ) if self.prune_fns else None
+                if pruned_by is not None:
+                    #BEGIN TRACING
+                    if self.trace > 1:
+                        self._trace("Successor State pruned by " + pruned_by)
+                    #END TRACING
+                    #dead state, never to be reached again via a path that
+                    #is no cheaper
+                    if self.cycle_check == _CC_FULL:
+                        self.cc_dictionary[hash_state] = succ.gval
+                    continue
+
+                if self.deferred:
+                    #evaluated when extracted, only the gval can be checked now
+                    succ_hval = node.hval
+                    over_bound = costbound is not None and succ.gval > costbound[0]
+                else:
+                    succ_hval = heur_fn(succ)
+                    self.heur_evaluations = self.heur_evaluations + 1
+                    over_bound = costbound is not None and (succ.gval > costbound[0] or
+                                                            succ_hval > costbound[1] or
+                                                            succ.gval + succ_hval > costbound[2])
+                    #BEGIN TRACING
+                    if self.trace > 1:
+                        self._trace("Heuristic Value: {}".format(succ_hval))
+                    #END TRACING
+                if over_bound:
+                    self.cost_bound_pruned = self.cost_bound_pruned + 1
+                    #BEGIN TRACING
+                    if self.trace > 1:
+                        self._trace("Successor State pruned, over current cost bound of {}".format(costbound))
+                    #END TRACING
+                    continue
+
+                #passed all cycle checks and costbound checks ...add to open
+                child = sNode(succ, succ_hval, fval_function, self.deferred)
+                if self.compact:
+                    #the trace table holds the path, free the parent
+                    child.parent_slot = slot
+                    succ.parent = None
+                self.open.insert(child)
+
+                #BEGIN TRACING
+                if self.trace > 1:
+                    self._trace("Successor State added to OPEN")
+                #END TRACING
+
+                #record cost of this path in dictionary.
+                if self.cycle_check == _CC_FULL:
+                    self.cc_dictionary[hash_state] = succ.gval
+
+            self.states_generated = self.states_generated + generated
+            if len(self.open) > self.peak_open_size:
+                self.peak_open_size = len(self.open)
+
+        #end of while--OPEN is empty and no solution
+        return False
+
+    def _searchIDA(self, root, goal_fn, heur_fn, fval_function):
+        """
+        Iterative deepening A*: depth first searches from root that only
+        expand nodes whose gval + hval is within a threshold. The first
+        threshold is the f-value of root, every next one is the smallest
+        f-value that exceeded the previous one. Memory is linear in the
+        depth of the search (plus the transposition table, if any).
+
+        This is a generator. It yields each goal node it finds and, when
+        the time bound set by search() has been exceeded, None; the next
+        call of search() resumes it where it stopped. The cost bound is
+        read from self.costbound on every expansion.
+        """
+        threshold = root.gval + root.hval
+        while True:
+            #BEGIN TRACING
+            if self.trace:
+                self._trace("IDA* iteration with f-value threshold {}".format(threshold))
+            #END TRACING
+            next_threshold = float('inf')
+            if self.cycle_check == _CC_FULL:
+                #the transposition table only holds states of this iteration
+                self.cc_dictionary.clear()
+                self.cc_dictionary[self.state_key(root.state)] = root.gval
+
+            #each entry of the stack iterates over the children (ordered
+            #by f-value) of a node on the current path. With cycle checking
+            #the hashable states of these nodes are kept in path (and
+            #on_path, for the cycle checks)
+            stack = [iter([root])]
+            path = []
+            on_path = set()
+            while stack:
+                node = next(stack[-1], None)
+                if node is None:
+                    stack.pop()
+                    if path:
+                        on_path.discard(path.pop())
+                    continue
+
+                if node.gval + node.hval > threshold:
+                    if node.gval + node.hval < next_threshold:
+                        next_threshold = node.gval + node.hval
+                    continue
+
+                #BEGIN TRACING
+                if self.trace:
+                    self._trace("Next State to expand: <S{}:{}:{}, g={}, h={}, f=g+h={}>".format(
+                        node.state.index, node.state.action, node.state.hashable_state(), node.gval, node.hval, node.gval + node.hval))
+                #END TRACING
+
+                if goal_fn(node.state):
+                    yield node
+                    continue
+
+                if self.deadline.expired():
+                    self.timed_out = True
+                    #BEGIN TRACING
+                    if self.trace:
+                        self._trace("Search has exceeded the time bound provided.")
+                    #END TRACING
+                    yield None
+
+                successors = self.successors_fn(node.state)
+                self.nodes_expanded = self.nodes_expanded + 1
+                self.states_generated = self.states_generated + len(successors)
+
+                costbound = self.costbound
+                if self.cycle_check != _CC_NONE:
+                    key = node.state.hashable_state()
+                    path.append(key)
+                    on_path.add(key)
+                children = []
+                for succ in successors:
+                    if self.cycle_check != _CC_NONE and succ.hashable_state() in on_path:
+                        self.cycle_check_pruned = self.cycle_check_pruned + 1
+                        continue
+                    if self.cycle_check == _CC_FULL:
+                        hash_state = self.state_key(succ)
+                        if succ.gval >= self.cc_dictionary.get(hash_state, float('inf')):
+                            self.cycle_check_pruned = self.cycle_check_pruned + 1
+                            continue
+                        self.cc_dictionary[hash_state] = succ.gval
+
+                    succ_hval = heur_fn(succ)
+                    self.heur_evaluations = self.heur_evaluations + 1
+                    if costbound is not None and (succ.gval > costbound[0] or
+                                                  succ_hval > costbound[1] or
+                                                  succ.gval + succ_hval > costbound[2]) :
+                        self.cost_bound_pruned = self.cost_bound_pruned + 1
+                        continue
+                    children.append(sNode(succ, succ_hval, fval_function))
+
+                #try the most promising children first
+                children.sort(key=lambda child: child.gval + child.hval)
+                stack.append(iter(children))
+                if len(stack) > self.peak_open_size:
+                    self.peak_open_size = len(stack)
+
+            if next_threshold == float('inf'):
+                #nothing was cut off by the threshold, the space is exhausted
+                return
+            threshold = next_threshold
+
+    def _searchBidirectional(self, initState, goal_states, fval_function):
+        """
+        Bidirectional uniform cost search. One OPEN is searched forwards
+        from initState (with successors()), the other backwards from the
+        goal states (with predecessors()); each step expands a node of the
+        smaller OPEN. Every state reached is recorded with its cheapest
+        gval in the dictionary of its direction, and a state found in
+        both dictionaries joins a path from initState to a goal. The
+        search stops when the cheapest such path costs no more than the
+        sum of the smallest gvals on the two OPENs, no cheaper path can
+        then exist.
+
+        This is a generator, it yields the goal node (whose state has the
+        stitched path as its parent chain), or None when the time bound
+        set by search() has been exceeded (the search is then resumed by
+        the next call of search()). The cost bound is not used.
+        """
+        #the two searches meet in a state with the same key, so the key
+        #must identify the state exactly (a canonical key would join paths
+        #that end in different states)
+        state_key = self.state_key if self.cc_key in ('hash', 'compact') else _CC_KEYS['hash']
+        forward = Open(_UCS)
+        backward = Open(_UCS)
+        #best state found so far for each key, in each direction
+        self.forward_states = {state_key(initState): initState}
+        self.backward_states = {}
+        forward.insert(sNode(initState, 0, fval_function))
+        for goal in goal_states:
+            key = state_key(goal)
+            if key not in self.backward_states or goal.gval < self.backward_states[key].gval:
+                self.backward_states[key] = goal
+                backward.insert(sNode(goal, 0, fval_function))
+
+        #cheapest path found so far: its cost and the two states it joins
+        best_cost = float('inf')
+        best_meet = None
+        key = state_key(initState)
+        if key in self.backward_states:
+            best_cost = self.backward_states[key].gval
+            best_meet = (initState, self.backward_states[key])
+
+        while not forward.empty() and not backward.empty():
+            if forward.peek().gval + backward.peek().gval >= best_cost:
+                break
+
+            if len(forward) <= len(backward):
+                node = forward.extract()
+                states, other_states, search_open = self.forward_states, self.backward_states, forward
+                expand = self.successors_fn
+            else:
+                node = backward.extract()
+                states, other_states, search_open = self.backward_states, self.forward_states, backward
+                expand = self.predecessors_fn
+
+            if states[state_key(node.state)].gval < node.gval:
+                #reached more cheaply since this node was inserted
+                self.cycle_check_pruned = self.cycle_check_pruned + 1
+                continue
+
+            if self.deadline.expired():
+                self.timed_out = True
+                #BEGIN TRACING
+                if self.trace:
+                    self._trace("Search has exceeded the time bound provided.")
+                #END TRACING
+                yield None
+
+            #BEGIN TRACING
+            if self.trace:
+                self._trace("Next State to expand ({}): <S{}:{}:{}, g={}>".format(
+                    "forward" if states is self.forward_states else "backward",
+                    node.state.index, node.state.action, node.state.hashable_state(), node.gval))
+            #END TRACING
+
+            neighbours = expand(node.state)
+            self.nodes_expanded = self.nodes_expanded + 1
+            self.states_generated = self.states_generated + len(neighbours)
+            for succ in neighbours:
+                key = state_key(succ)
+                if key in states and states[key].gval <= succ.gval:
+                    self.cycle_check_pruned = self.cycle_check_pruned + 1
+                    continue
+                states[key] = succ
+                search_open.insert(sNode(succ, 0, fval_function))
+                if key in other_states and succ.gval + other_states[key].gval < best_cost:
+                    best_cost = succ.gval + other_states[key].gval
+                    if states is self.forward_states:
+                        best_meet = (succ, other_states[key])
+                    else:
+                        best_meet = (other_states[key], succ)
+
+            if len(forward) + len(backward) > self.peak_open_size:
+                self.peak_open_size = len(forward) + len(backward)
+
+        if best_meet is not None:
+            yield sNode(self._join_paths(*best_meet), 0, fval_function)
+
+    def _join_paths(self, forward_state, backward_state):
+        """
+        Return a goal state whose parent chain is the path to
+        forward_state followed by the path from backward_state (the same
+        problem state, reached backwards) to the goal. The states of the
+        backward path are copied and re-linked in the forward direction.
+        """
+        state = forward_state
+        back = backward_state
+        while back.parent:
+            succ = copy.copy(back.parent)
+            #back.action takes back to its (backward) parent
+            succ.action = back.action
+            succ.gval = state.gval + (back.gval - back.parent.gval)
+            succ.parent = state
+            state = succ
+            back = back.parent
+        return state
+
+class ARAStarEngine(SearchEngine):
+    '''Anytime Repairing A* (Likhachev, Gordon and Thrun, 2003).
+
+       Runs weighted A* (fval = gval + weight*hval) once for each weight of
+       a decreasing sequence, e.g., 5, 3, 2, 1.5, 1. Each run continues the
+       previous one instead of starting over: the nodes left on OPEN are
+       re-ordered by the new f-values, and the states that were reached via
+       a cheaper path after they had been expanded (in the same run) are
+       kept on an INCONS list and put back on OPEN for the next run. Within
+       one run no state is expanded more than once.
+
+       A run ends once no node on OPEN has a smaller f-value than the cost
+       of the best solution known. Every run that ends with a better
+       solution appends (goal state, cost, bound) to self.solutions, where
+       the cost is at most bound times the optimal cost if the heuristic is
+       admissible, and calls report(goal state, cost, bound) if a report
+       function was given to init_search.
+
+       search returns the best goal state found (or False), and can be
+       called again to resume after running out of time.'''
+
+    def __init__(self, weights = (5, 3, 2, 1.5, 1)):
+        SearchEngine.__init__(self, 'custom', 'full')
+        self.weights = tuple(weights)
+
+    def set_open_backend(self, backend = 'heap'):
+        '''As SearchEngine.set_open_backend, but only 'heap' and 'indexed':
+           the weighted f-values of the runs are not the integer keys of a
+           bucket queue.'''
+        if backend in ['auto', 'bucket']:
+            print("ARAStarEngine can't keep OPEN as", backend)
+            print("Must be one of ['heap', 'indexed']")
+        else:
+            SearchEngine.set_open_backend(self, backend)
+
+    def init_search(self, initState, goal_fn, heur_fn=_zero_hfn, report=None):
+        """
+        Get ready to search. Call search on this object to run the search.
+
+        @param initState: the state of the puzzle to start the search from.
+        @param goal_fn: the goal function for the puzzle
+        @param heur_fn: the heuristic function to use
+        @param report: optional function called with (goal state, cost, bound)
+                       for every improved solution
+        """
+        self.weight_index = 0
+        SearchEngine.init_search(self, initState, goal_fn, heur_fn,
+                                 functools.partial(_weighted_fval, weight=self.weights[0]))
+        self.report = report
+        self.closed = set()
+        self.incons = {}
+        self.solutions = []
+        self.goal_node = None
+        self.goal_cost = float('inf')
+        if self.goal_fn(initState):
+            self.goal_node = self.open.extract()
+            self.goal_cost = initState.gval
+
+    def search(self, timebound=None, until_improved=False):
+        """
+        Run (or resume) the sequence of weighted searches.
+
+        @param timebound: the maximum amount of time, in seconds, to spend on this search
+                          (measured as set by set_clock), or a Deadline.
+        @param until_improved: return as soon as a run has improved the solution
+                               (search can then be called again to continue).
+        """
+        wall_start_time = time.perf_counter()
+        self.timed_out = False
+        if isinstance(timebound, Deadline):
+            self.deadline = timebound
+        else:
+            self.deadline = Deadline(timebound or None, self.clock, self.check_every)
+        while self._improve_path():
+            improved = self._record_solution()
+            if self.goal_node is None or self.weight_index == len(self.weights) - 1:
+                break
+            self.weight_index = self.weight_index + 1
+            self._next_weight()
+            if improved and until_improved:
+                break
+        if self.cc_max_size is not None:
+            self.cc_evicted = self.cc_dictionary.evicted
+        self.search_time = self.search_time + time.perf_counter() - wall_start_time
+        self.stats = SearchStats(self)
+        return self.goal_node.state if self.goal_node else False
+
+    def _improve_path(self):
+        '''One weighted A* run. Returns False if it ran out of time.'''
+        state_key = self.state_key
+        heur_fn = self.heur_fn
+        goal_fn = self.goal_fn
+        fval_function = self.fval_function
+        cc_dictionary = self.cc_dictionary
+        while not self.open.empty() and self.open.first_key() < self.goal_cost:
+            node = self.open.extract()
+            key = state_key(node.state)
+
+            #skip nodes that have been superseded by a cheaper path to
+            #their state
+            if cc_dictionary.get(key, node.gval) < node.gval:
+                self.stale_skipped = self.stale_skipped + 1
+                continue
+
+            if self.deadline.expired(): #timebound check
+                self.open.putback(node)
+                self.timed_out = True
+                #BEGIN TRACING
+                if self.trace:
+                    self._trace("Search has exceeded the time bound provided.")
+                #END TRACING
+                return False
+
+            #BEGIN TRACING
+            if self.trace:
+                self._trace("Next State to expand: <S{}:{}:{}, g={}, h={}, f={}>".format(
+                    node.state.index, node.state.action, node.state.hashable_state(), node.gval, node.hval,
+                    fval_function(node)))
+            #END TRACING
+
+            self.closed.add(key)
+            successors = self.successors_fn(node.state)
+            self.nodes_expanded = self.nodes_expanded + 1
+            self.states_generated = self.states_generated + len(successors)
+
+            for succ in successors:
+                hash_state = state_key(succ)
+                if hash_state in cc_dictionary and succ.gval >= cc_dictionary[hash_state]:
+                    self.cycle_check_pruned = self.cycle_check_pruned + 1
+                    continue
+                cc_dictionary[hash_state] = succ.gval
+                if self.prune_fns and self._prune(succ) is not None:
+                    #dead state, never to be reached again via a path that
+                    #is no cheaper
+                    continue
+                succ_node = sNode(succ, heur_fn(succ), fval_function)
+                self.heur_evaluations = self.heur_evaluations + 1
+                if goal_fn(succ):
+                    #goals are not expanded, a path through one can only cost
+                    #more; a goal is only kept if it is cheaper than the best
+                    #one so far (goal states with different keys are not
+                    #compared by the closed set)
+                    if succ.gval < self.goal_cost:
+                        self.goal_node = succ_node
+                        self.goal_cost = succ.gval
+                elif hash_state in self.closed:
+                    self.incons[hash_state] = succ_node
+                else:
+                    self.open.insert(succ_node)
+
+            if len(self.open) > self.peak_open_size:
+                self.peak_open_size = len(self.open)
+        return True
+
+    def _record_solution(self):
+        '''Record (and report) the solution of a finished run if it is better
+           than the last one recorded. Returns True if it was.'''
+        if self.goal_node is None or (self.solutions and self.solutions[-1][1] <= self.goal_cost):
+            return False
+        #the optimal cost is at least the smallest gval + hval of the nodes
+        #still to be expanded (if the heuristic is admissible)
+        state_key = self.state_key
+        min_f = min((node.gval + node.hval
+                     for node in itertools.chain(self.open.nodes(), self.incons.values())
+                     if self.cc_dictionary.get(state_key(node.state), node.gval) >= node.gval),
+                    default=float('inf'))
+        weight = self.weights[self.weight_index]
+        if min_f <= 0:
+            bound = weight
+        else:
+            bound = max(1, min(weight, self.goal_cost/min_f))
+        self.solutions.append((self.goal_node.state, self.goal_cost, bound))
+        #BEGIN TRACING
+        if self.trace:
+            self._trace("Solution of cost {} found with weight {}, within a factor {} of optimal".format(
+                self.goal_cost, weight, bound))
+        #END TRACING
+        if self.report:
+            self.report(self.goal_node.state, self.goal_cost, bound)
+        return True
+
+    def _next_weight(self):
+        '''Move the INCONS nodes to OPEN, re-order OPEN by the next weight and
+           start with an empty CLOSED'''
+        for node in self.incons.values():
+            self.open.insert(node)
+        self.incons = {}
+        self.closed = set()
+        self.set_fval_function(functools.partial(_weighted_fval, weight=self.weights[self.weight_index]))
+
+#Portfolio search. Each configuration is run by its own SearchEngine in
+#a worker process. Configurations are 4-tuples
+#   (strategy, heur_fn, weight, cc_level)
+#where strategy and cc_level are as for SearchEngine.set_strategy and
+#weight (may be None) turns the search into a 'custom' search ordered by
+#fval = gval + weight*hval. heur_fn, goal_fn and the states must be
+#picklable, i.e., module level functions and ordinary StateSpace objects.
+
+def _weighted_fval(sN, weight):
+    '''fval = gval + weight*hval (used for weighted configurations)'''
+    return sN.gval + weight*sN.hval
+
+def _detach_path(state):
+    '''Return the path to state as a list of states (initial state
+       first) with the parent pointers removed. Pickling the list is
+       iterative, whereas pickling a long parent chain recurses once
+       per state.'''
+    path = []
+    while state:
+        path.append(state)
+        state = state.parent
+    path.reverse()
+    for s in path:
+        s.parent = None
+    return path
+
+def _attach_path(path):
+    '''Inverse of _detach_path, returns the final state of the path'''
+    for i in range(1, len(path)):
+        path[i].parent = path[i-1]
+    return path[-1]
+
+def _portfolio_worker(job):
+    '''Run one portfolio configuration, returns (config number, path)
+       where path is False if the search failed.'''
+    number, initState, goal_fn, config, timebound = job
+    strategy, heur_fn, weight, cc_level = config
+    fval_function = _fval_function
+    if weight is not None:
+        strategy = 'custom'
+        fval_function = functools.partial(_weighted_fval, weight=weight)
+    se = SearchEngine(strategy, cc_level)
+    se.init_search(initState, goal_fn, heur_fn, fval_function)
+    final = se.search(timebound)
+    if not final:
+        return number, False
+    return number, _detach_path(final)
+
+def portfolio_search(initState, goal_fn, configs, timebound=10, best=False, processes=None):
+    '''Search for a path from initState to a goal with all of the
+       configurations in configs, in parallel.
+
+       @param initState: the initial state, shared by all configurations.
+       @param goal_fn: the goal function for the problem.
+       @param configs: a list of (strategy, heur_fn, weight, cc_level) tuples.
+       @param timebound: wall-clock seconds for the whole portfolio.
+       @param best: if False return the first solution found, otherwise wait
+                    for all configurations (or the timebound) and return the
+                    cheapest solution.
+       @param processes: size of the process pool (default: one per
+                         configuration, so that all of them run at once
+                         even when there are fewer cpus).
+       @return: a goal state (with its full path), or False.
+       Configurations still running when the result is decided are cancelled.'''
+    if not configs:
+        return False
+    if processes is None:
+        processes = len(configs)
+    stop_time = time.monotonic() + timebound
+    jobs = [(i, initState, goal_fn, config, timebound) for i, config in enumerate(configs)]
+
+    best_path = False
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.imap_unordered(_portfolio_worker, jobs)
+        for _ in jobs:
+            remaining = stop_time - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                number, path = results.next(timeout=remaining)
+            except multiprocessing.TimeoutError:
+                break
+            if path and (not best_path or path[-1].gval < best_path[-1].gval):
+                best_path = path
+                if not best:
+                    break
+    finally:
+        #cancel the configurations that are still searching
+        pool.terminate()
+        pool.join()
+
+    if not best_path:
+        return False
+    return _attach_path(best_path)
+
+if __name__ == "__main__":
+    #Check that BucketOpen extracts the nodes in the same order of key as
+    #Open (the order of nodes with equal keys may differ), with inserts
+    #and extracts interleaved and with a key that makes it fall back.
+    import random
+    rng = random.Random(384)
+    keys = [('ucs', _UCS, lambda node: node.gval),
+            ('best_first', _BEST_FIRST, lambda node: node.hval),
+            ('astar', _ASTAR, lambda node: (node.gval + node.hval, -node.gval))]
+    for name, strategy, key in keys:
+        for fall_back in (False, True):
+            heap = Open(strategy)
+            buckets = BucketOpen(strategy)
+            heap_order = []
+            bucket_order = []
+            for step in range(2000):
+                if rng.random() < 0.6 or heap.empty():
+                    if fall_back and step == 1000:
+                        gval, hval = 2.5, 2.5
+                    else:
+                        gval, hval = rng.randint(0, 12), rng.randint(0, 12)
+                    node = sNode(StateSpace("START", gval, None), hval)
+                    heap.insert(node)
+                    buckets.insert(node)
+                else:
+                    heap_order.append(heap.extract())
+                    bucket_order.append(buckets.extract())
+            while not heap.empty():
+                heap_order.append(heap.extract())
+                bucket_order.append(buckets.extract())
+            same = ([key(node) for node in heap_order] == [key(node) for node in bucket_order] and
+                    set(map(id, heap_order)) == set(map(id, bucket_order)) and
+                    buckets.empty() and buckets.fallback == fall_back)
+            print("BucketOpen vs Open, {}{}: {}".format(name, ", falling back to a heap" if fall_back else "",
+                                                     "same order" if same else "DIFFERENT ORDER"))
@@ -8,10 +8,37 @@
 
     An encoding of the directions of movement that are possible for robots in Sokoban.
 
+    C) Classes SokobanLevel and BitboardSokobanState
+
+    An alternative, more compact, encoding of Sokoban states. The static part of a
+    problem (dimensions, storage points, obstacles) is kept once per level, and
+    robots and boxes are encoded as board cell indices and integer bitmasks.
+
+    D) Class SokobanPushState
+
+    A SokobanState whose successors are box pushes (the robot's walk to the box is part of
+    the push, and counted in its cost), optionally with tunnel and goal room macros.
+
+    E) Class SokobanPDB
+
+    Additive pattern databases (the pushes needed to store every set of k boxes) for
+    lower bounds on the cost of a state, saved to disk per level.
+
+    F) Functions freeze_deadlock and corral_deadlock
+
+    Deadlock tests that can be given to SearchEngine.add_prune_fn, so that deadlocked
+    states are never put on OPEN.
+
     Code also contains a list of 40 Sokoban problems for the purpose of testing.
 '''
 
 from search import *
+from collections import deque
+import hashlib
+import itertools
+import mmap
+import os
+import struct
 
 class SokobanState(StateSpace):
 
@@ -37,7 +64,12 @@ class SokobanState(StateSpace):
         '''
         Generates all the actions that can be performed from this state, and the states those actions will create.        
         '''
-        successors = []
+        return list(self.iter_successors())
+
+    def iter_successors(self):
+        '''
+        Generator version of successors, creates the successor states one at a time.
+        '''
         transition_cost = 1
         moved_boxes = frozenset()
 
@@ -84,13 +116,120 @@ class SokobanState(StateSpace):
               new_robots = tuple(new_robots)
 
               new_state = SokobanState(str(robot) + " " + direction.name, self.gval + transition_cost, self, self.width, self.height, new_robots, frozenset(new_boxes), self.storage, self.obstacles)
-              successors.append(new_state)
+              yield new_state
+
+    def push_successors(self, tunnels = False, goal_rooms = False):
+        '''
+        Generates the states reachable by walking one robot (around the boxes and the other robots)
+        and then pushing a box, one state per push. The cost of the walk is included in the gval.
+        @param tunnels: Keep pushing a box along a one cell wide tunnel, see iter_push_successors.
+        @param goal_rooms: Keep pushing a box into an area of storage points, see iter_push_successors.
+        '''
+        return list(self.iter_push_successors(tunnels, goal_rooms))
+
+    def iter_push_successors(self, tunnels = False, goal_rooms = False):
+        '''
+        Generator version of push_successors.
+
+        The robot walks the shortest way (found by a flood fill) to the cell next to the box.
+        The macros push a box further, as part of the same successor:
+          tunnels: while the box and the robot are in a one cell wide tunnel (walls on both
+                   sides of both of them) and the box is not on a storage point, since the
+                   only way to make progress with the box is to push it on.
+          goal_rooms: when a box is pushed onto a storage point, while the next cell in the
+                   push direction is a free storage point, filling storage areas from the
+                   far side. This can lose solutions (and optimality).
+        Only one robot moves per successor, so with several robots a solution that needs a
+        robot to step out of the way of another (without pushing a box) is not found.
+        '''
+        level = sokoban_level(self)
+        walls = level.wall_mask
+        boxes = level.mask(self.boxes)
+        robot_cells = [level.index(robot) for robot in self.robots]
+        robot_mask = level.mask(self.robots)
+
+        for robot, start in enumerate(robot_cells):
+            blocked = walls | boxes | (robot_mask ^ (1 << start))
+            #walking distances of this robot
+            distance = {start: 0}
+            queue = deque([start])
+            while queue:
+                cell = queue.popleft()
+                for direction, delta in level.moves:
+                    box = cell + delta
+                    if (blocked >> box) & 1:
+                        #a box this robot can push from cell (onto a cell that is not blocked)
+                        if (boxes >> box) & 1 and not (blocked >> (box + delta)) & 1:
+                            yield self._push(level, robot, cell, distance[cell], direction, delta,
+                                             boxes, blocked, tunnels, goal_rooms)
+                    elif box not in distance:
+                        distance[box] = distance[cell] + 1
+                        queue.append(box)
 
-        return successors
+    def _push(self, level, robot, robot_cell, walk, direction, delta, boxes, blocked, tunnels, goal_rooms):
+        '''@return: The state after the robot walks to robot_cell (in walk steps) and pushes in direction.'''
+        pushed = robot_cell + delta
+        #robot and box after the push
+        robot_at = pushed
+        box_at = pushed + delta
+        pushes = 1
+        if tunnels or goal_rooms:
+            walls = level.wall_mask
+            storage = level.storage_mask
+            side = level.stride if delta in (1, -1) else 1
+            while True:
+                target = box_at + delta
+                if (blocked >> target) & 1 or (level.dead_mask >> target) & 1:
+                    break
+                if (storage >> box_at) & 1:
+                    #keep pushing into the goal room of the box
+                    if not (goal_rooms and (level.goal_room_mask[box_at] >> target) & 1):
+                        break
+                elif not (tunnels and
+                          (walls >> (robot_at + side)) & 1 and (walls >> (robot_at - side)) & 1 and
+                          (walls >> (box_at + side)) & 1 and (walls >> (box_at - side)) & 1):
+                    break
+                robot_at = box_at
+                box_at = target
+                pushes += 1
+        new_boxes = boxes ^ (1 << pushed) | (1 << box_at)
+        new_robots = list(self.robots)
+        new_robots[robot] = level.location(robot_at)
+        action = "{} {} {}".format(robot, direction.name, level.location(pushed))
+        if pushes > 1:
+            action += " x{}".format(pushes)
+        return type(self)(action, self.gval + walk + pushes, self, self.width, self.height, tuple(new_robots),
+                          frozenset(level.location(cell) for cell in level.cells(new_boxes)), self.storage, self.obstacles)
 
     def hashable_state(self):
         '''Return a data item that can be used as a dictionary key to UNIQUELY represent a state.'''
-        return hash((self.robots, self.boxes))       
+        return (self.robots, self.boxes)
+
+    def box_key(self):
+        '''Return a data item that UNIQUELY represents the positions of the boxes (see sokoban_box_key).'''
+        return self.boxes
+
+    def canonical_state(self, robot_symmetry = False):
+        '''
+        Return a data item that represents the state, with the robots treated as interchangeable if
+        robot_symmetry (all robots move alike, so this keeps the search optimal). Without robot_symmetry it
+        is the hashable_state. See SokobanPushState for a key that also merges robot positions.
+        '''
+        if robot_symmetry:
+            return (tuple(sorted(self.robots)), self.boxes)
+        return self.hashable_state()
+
+    def compact_state(self):
+        '''
+        Return a compact key that UNIQUELY represents a state: the robots' coordinates followed by the
+        sorted boxes' coordinates, packed one byte per coordinate.
+        '''
+        if self.width > 256 or self.height > 256:
+            return (self.robots, tuple(sorted(self.boxes)))
+        coordinates = [c for robot in self.robots for c in robot]
+        for box in sorted(self.boxes):
+            coordinates += box
+        return bytes(coordinates)
 
     def state_string(self):
         '''Returns a string representation fo a state that can be printed to stdout.'''        
@@ -147,6 +286,634 @@ def sokoban_goal_state(state):
       return False
   return True
 
+
+class SokobanLevel:
+    '''
+    The static part of a Sokoban problem: the room's dimensions, storage points and obstacles,
+    together with an analysis of the level that only depends on these.
+
+    Cells are numbered row by row on the room surrounded by a one cell thick wall, so
+    location (x, y) is cell (y + 1) * stride + (x + 1) where stride = width + 2. Moving
+    up, right, down or left adds -stride, 1, stride or -1 to a cell, and a set of cells
+    is an int with bit i set for every cell i in the set.
+
+    The analysis (computed once per level, see sokoban_level) consists of
+      push_distances: for each storage point, a list giving for every cell the minimum
+                      number of pushes needed to move a box from that cell onto the
+                      storage point (ignoring the other boxes and robots), inf if it
+                      can't be done.
+      min_push_distance: for every cell, the minimum of push_distances over all storage points.
+      dead_mask: the floor cells (dead squares) from which a box can never reach any
+                      storage point. A box on a dead square means the state is a deadlock.
+      goal_rooms: the masks of the areas of adjacent storage points.
+      goal_room_mask: for every cell, the mask of the goal room it is in (0 if it is not a
+                      storage point). Used by the goal room macro of the push successors.
+    '''
+
+    def __init__(self, width, height, storage, obstacles):
+        self.width = width
+        self.height = height
+        self.storage = storage
+        self.obstacles = obstacles
+        self.stride = width + 2
+        self.num_cells = self.stride * (height + 2)
+        #bits needed to store a cell index
+        self.cell_bits = self.num_cells.bit_length()
+        self.moves = ((UP, -self.stride), (RIGHT, 1), (DOWN, self.stride), (LEFT, -1))
+
+        self.storage_mask = self.mask(storage)
+        #the border and the obstacles: no robot or box can ever be on these cells
+        self.wall_mask = self.mask(obstacles)
+        for cell in range(self.num_cells):
+            x, y = self.location(cell)
+            if x < 0 or x >= width or y < 0 or y >= height:
+                self.wall_mask |= 1 << cell
+
+        self._analyse()
+
+    def _analyse(self):
+        '''Compute the push distances, dead squares and goal rooms of the level.'''
+        inf = float('inf')
+        floor = [not (self.wall_mask >> cell) & 1 for cell in range(self.num_cells)]
+
+        #Reverse BFS from every storage point over pulls: a box on cell c could have
+        #been pushed there (in direction delta) from c - delta if that cell is floor and
+        #the robot could stand behind it, on c - 2 * delta.
+        self.push_distances = {}
+        self.min_push_distance = [inf] * self.num_cells
+        for storage_point in self.storage:
+            distance = [inf] * self.num_cells
+            start = self.index(storage_point)
+            distance[start] = 0
+            queue = deque([start])
+            while queue:
+                cell = queue.popleft()
+                for _, delta in self.moves:
+                    box_from = cell - delta
+                    if floor[box_from] and floor[box_from - delta] and distance[box_from] == inf:
+                        distance[box_from] = distance[cell] + 1
+                        queue.append(box_from)
+            self.push_distances[storage_point] = distance
+            for cell in range(self.num_cells):
+                if distance[cell] < self.min_push_distance[cell]:
+                    self.min_push_distance[cell] = distance[cell]
+
+        self.dead_mask = 0
+        for cell in range(self.num_cells):
+            if floor[cell] and self.min_push_distance[cell] == inf:
+                self.dead_mask |= 1 << cell
+
+        #areas of adjacent storage points
+        self.goal_rooms = []
+        self.goal_room_mask = [0] * self.num_cells
+        for start in self.cells(self.storage_mask):
+            if self.goal_room_mask[start]:
+                continue
+            goal_room = self.region(start, ~self.storage_mask)
+            self.goal_rooms.append(goal_room)
+            for cell in self.cells(goal_room):
+                self.goal_room_mask[cell] = goal_room
+
+    def index(self, location):
+        '''@return: The cell index of an (x, y) location.'''
+        return (location[1] + 1) * self.stride + location[0] + 1
+
+    def location(self, cell):
+        '''@return: The (x, y) location of a cell index.'''
+        return (cell % self.stride - 1, cell // self.stride - 1)
+
+    def mask(self, locations):
+        '''@return: The bitmask of a collection of (x, y) locations.'''
+        mask = 0
+        for location in locations:
+            mask |= 1 << self.index(location)
+        return mask
+
+    def cells(self, mask):
+        '''Generates the cell indices of the bits set in mask (lowest first).'''
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def region(self, cell, blocked):
+        '''@return: The bitmask of the cells that can be reached from cell without entering a cell of blocked.'''
+        free = ~blocked
+        stride = self.stride
+        region = 1 << cell
+        while True:
+            grown = region | ((region << 1 | region >> 1 | region << stride | region >> stride) & free)
+            if grown == region:
+                return region
+            region = grown
+
+    def region_keys(self, robot_cells, blocked, robot_symmetry = False):
+        '''
+        @return: A tuple giving for every robot the smallest cell index of the region (see region) it is in,
+                 sorted if robot_symmetry.
+        '''
+        keys = []
+        regions = []
+        for cell in robot_cells:
+            #robots in a region already seen share its key
+            for region, key in regions:
+                if (region >> cell) & 1:
+                    break
+            else:
+                region = self.region(cell, blocked)
+                key = (region & -region).bit_length() - 1
+                regions.append((region, key))
+            keys.append(key)
+        if robot_symmetry:
+            keys.sort()
+        return tuple(keys)
+
+
+class SokobanPushState(SokobanState):
+    '''
+    A SokobanState whose successors are its push successors (see SokobanState.iter_push_successors),
+    so that a search runs over box pushes rather than robot steps, with the walks counted in the gval.
+    The tunnel and goal room macros are off unless turned on with from_state.
+    '''
+
+    tunnel_macros = False
+    goal_room_macros = False
+
+    @classmethod
+    def from_state(cls, state, tunnels = False, goal_rooms = False):
+        '''@return: The SokobanPushState equivalent to a SokobanState (without its parent).'''
+        push_state = cls(state.action, state.gval, None, state.width, state.height, state.robots, state.boxes,
+                         state.storage, state.obstacles)
+        push_state.tunnel_macros = tunnels
+        push_state.goal_room_macros = goal_rooms
+        return push_state
+
+    def canonical_state(self, robot_symmetry = False):
+        '''
+        Return a data item that represents the boxes and, instead of the robots' locations, the areas the
+        robots can walk around in (without pushing a box): for each robot the smallest cell index of its
+        area. States that only differ in where the robots stand in these areas get the same key, and have
+        the same push successors. With robot_symmetry the robots are also treated as interchangeable.
+        A search using this key (see SearchEngine.set_closed_set) keeps the cheapest path found first to
+        any of the merged states, so it is not optimal since the walks differ, and with several robots in
+        one area it assumes they can get past each other.
+        '''
+        level = sokoban_level(self)
+        robot_cells = [level.index(robot) for robot in self.robots]
+        return (level.region_keys(robot_cells, level.wall_mask | level.mask(self.boxes), robot_symmetry), self.boxes)
+
+    def iter_successors(self):
+        '''
+        Generates the push successors of this state, with the macros of this state.
+        '''
+        for succ in self.iter_push_successors(self.tunnel_macros, self.goal_room_macros):
+            succ.tunnel_macros = self.tunnel_macros
+            succ.goal_room_macros = self.goal_room_macros
+            yield succ
+
+
+#SokobanLevel objects are shared by all states of a level
+_levels = {}
+
+def sokoban_level(state):
+  '''Returns the (cached) SokobanLevel of a SokobanState or BitboardSokobanState'''
+  key = (state.width, state.height, state.obstacles, state.storage)
+  level = _levels.get(key)
+  if level is None:
+    level = SokobanLevel(state.width, state.height, state.storage, state.obstacles)
+    _levels[key] = level
+  return level
+
+
+class BitboardSokobanState(StateSpace):
+    '''
+    A Sokoban state with the robots stored as a tuple of cell indices, the boxes as a
+    bitmask and the static part of the problem in a shared SokobanLevel. It generates
+    the same successors (with the same action names) as SokobanState, and also offers
+    the robots, boxes, storage, ... of a SokobanState (as read only properties) so the
+    heuristics written for SokobanState can be used unchanged.
+    '''
+
+    __slots__ = ('level', 'robot_cells', 'box_mask')
+
+    def __init__(self, action, gval, parent, level, robot_cells, box_mask):
+        '''
+        Creates a new Sokoban state.
+        @param level: The SokobanLevel of the problem.
+        @param robot_cells: A tuple of the cell index of each robot.
+        @param box_mask: The bitmask of the cells holding a box.
+        '''
+        StateSpace.__init__(self, action, gval, parent)
+        self.level = level
+        self.robot_cells = robot_cells
+        self.box_mask = box_mask
+
+    @classmethod
+    def from_state(cls, state):
+        '''@return: The BitboardSokobanState equivalent to a SokobanState (without its parent).'''
+        level = sokoban_level(state)
+        return cls(state.action, state.gval, None, level,
+                   tuple(level.index(robot) for robot in state.robots), level.mask(state.boxes))
+
+    def successors(self):
+        '''
+        Generates all the actions that can be performed from this state, and the states those actions will create.
+        '''
+        return list(self.iter_successors())
+
+    def iter_successors(self):
+        '''
+        Generator version of successors, creates the successor states one at a time.
+        '''
+        level = self.level
+        robots = self.robot_cells
+        boxes = self.box_mask
+        gval = self.gval + 1
+        robot_mask = 0
+        for cell in robots:
+            robot_mask |= 1 << cell
+
+        for robot, cell in enumerate(robots):
+            #cells neither this robot nor a box it pushes can move onto
+            blocked = level.wall_mask | (robot_mask ^ (1 << cell))
+            for direction, delta in level.moves:
+                new_cell = cell + delta
+                new_bit = 1 << new_cell
+                if new_bit & blocked:
+                    continue
+                new_boxes = boxes
+                if new_bit & boxes:
+                    box_bit = new_bit << delta if delta > 0 else new_bit >> -delta
+                    if box_bit & (blocked | boxes):
+                        continue
+                    new_boxes = boxes ^ new_bit | box_bit
+                new_robots = robots[:robot] + (new_cell,) + robots[robot + 1:]
+                yield BitboardSokobanState(str(robot) + " " + direction.name, gval, self, level, new_robots, new_boxes)
+
+    def hashable_state(self):
+        '''Return a data item that can be used as a dictionary key to UNIQUELY represent a state.'''
+        key = self.box_mask
+        for cell in self.robot_cells:
+            key = (key << self.level.cell_bits) | cell
+        return key
+
+    def box_key(self):
+        '''Return a data item that UNIQUELY represents the positions of the boxes (see sokoban_box_key).'''
+        return self.box_mask
+
+    def canonical_state(self, robot_symmetry = False):
+        '''The canonical_state of SokobanState, packed into an int.'''
+        if not robot_symmetry:
+            return self.hashable_state()
+        key = self.box_mask
+        for cell in sorted(self.robot_cells):
+            key = (key << self.level.cell_bits) | cell
+        return key
+
+    @property
+    def width(self): return self.level.width
+
+    @property
+    def height(self): return self.level.height
+
+    @property
+    def storage(self): return self.level.storage
+
+    @property
+    def obstacles(self): return self.level.obstacles
+
+    @property
+    def robots(self):
+        return tuple(self.level.location(cell) for cell in self.robot_cells)
+
+    @property
+    def boxes(self):
+        return frozenset(self.level.location(cell) for cell in self.level.cells(self.box_mask))
+
+    state_string = SokobanState.state_string
+
+    print_state = SokobanState.print_state
+
+
+def sokoban_box_key(state):
+  '''Key for caching (see CachedHeuristic in search.py) the values of a heuristic that only depends
+     on the boxes, such as heur_manhattan_distance. Not for heuristics that look at the robots.'''
+  return state.box_key()
+
+def sokoban_symmetric_key(state):
+  '''Closed set key (see SearchEngine.set_closed_set): the canonical_state of a state with the robots treated
+     as interchangeable.'''
+  return state.canonical_state(robot_symmetry=True)
+
+def _moved_boxes(state, level):
+  '''Returns the mask of the boxes that are not where they were in the parent state (all boxes if there is none)'''
+  boxes = level.mask(state.boxes)
+  if state.parent is None:
+    return boxes
+  return boxes & ~level.mask(state.parent.boxes)
+
+def freeze_deadlock(state):
+  '''
+  Pruning function (see SearchEngine.add_prune_fn): returns True if a box that was just moved is frozen, i.e.,
+  can never be moved again, and it or a box frozen with it is not on a storage point. A box is frozen if along
+  both axes it is blocked by a wall, by dead squares on both sides, or by a box that is itself frozen (with the
+  first box taken as a wall). This includes boxes in 2x2 blocks of boxes and walls, and boxes stuck along walls.
+  '''
+  level = sokoban_level(state)
+  boxes = level.mask(state.boxes)
+  for cell in level.cells(_moved_boxes(state, level)):
+    frozen = []
+    if _frozen(level, boxes, cell, 1 << cell, frozen):
+      for box in frozen:
+        if not (level.storage_mask >> box) & 1:
+          return True
+  return False
+
+def _frozen(level, boxes, cell, fixed, frozen):
+  '''Whether the box on cell can't move along either axis, with the boxes in the mask fixed taken as walls. The
+     cells of the boxes found to be frozen are added to frozen.'''
+  found = len(frozen)
+  walls = level.wall_mask | fixed
+  for delta in (1, level.stride):
+    before = cell - delta
+    after = cell + delta
+    if (walls >> before) & 1 or (walls >> after) & 1:
+      continue
+    if (level.dead_mask >> before) & 1 and (level.dead_mask >> after) & 1:
+      continue
+    if (boxes >> before) & 1 and _frozen(level, boxes, before, fixed | (1 << before), frozen):
+      continue
+    if (boxes >> after) & 1 and _frozen(level, boxes, after, fixed | (1 << after), frozen):
+      continue
+    #the box can move along this axis
+    del frozen[found:]
+    return False
+  frozen.append(cell)
+  return True
+
+def corral_deadlock(state, max_nodes = 64):
+  '''
+  Pruning function (see SearchEngine.add_prune_fn): returns True if a box that was just moved borders a corral,
+  an area the robots can't reach, whose bordering boxes (not all on storage points) can't be stored. This is
+  decided by a push search of at most max_nodes states with just those boxes (the other boxes are left out,
+  which can only make it easier), which gives up, i.e., reports no deadlock, as soon as all the boxes are
+  stored, the robot gets into the corral, or the search gets too large.
+  Only states with a single robot are tested (for them a push search is complete and states with the robot
+  anywhere in the same area are equivalent); with several robots, which can step aside for each other, it
+  always returns False.
+  '''
+  if len(state.robots) != 1:
+    return False
+  level = sokoban_level(state)
+  moved = _moved_boxes(state, level)
+  if not moved:
+    return False
+  boxes = level.mask(state.boxes)
+  blocked = level.wall_mask | boxes
+  seen = _robots_region(level, state.robots, blocked)
+  stride = level.stride
+  for box in level.cells(moved):
+    for delta in (1, -1, stride, -stride):
+      cell = box + delta
+      if (blocked >> cell) & 1 or (seen >> cell) & 1:
+        continue
+      corral = level.region(cell, blocked)
+      seen |= corral
+      corral_boxes = (corral | corral << 1 | corral >> 1 | corral << stride | corral >> stride) & boxes
+      if corral_boxes & ~level.storage_mask and _corral_unsolvable(state, level, corral, corral_boxes, max_nodes):
+        return True
+  return False
+
+def _robots_region(level, robots, blocked):
+  '''Returns the mask of the cells the robots (at the given locations) can walk to'''
+  region = 0
+  for robot in robots:
+    cell = level.index(robot)
+    if not (region >> cell) & 1:
+      region |= level.region(cell, blocked)
+  return region
+
+def _corral_unsolvable(state, level, corral, corral_boxes, max_nodes):
+  '''The push search of corral_deadlock (for a state with a single robot), returns True only if it proves
+  the corral boxes can't be stored'''
+  start = SokobanPushState("START", 0, None, state.width, state.height, state.robots,
+                           frozenset(level.location(cell) for cell in level.cells(corral_boxes)),
+                           state.storage, state.obstacles)
+  seen = set([start.canonical_state()])
+  queue = deque([start])
+  expanded = 0
+  while queue:
+    current = queue.popleft()
+    expanded += 1
+    if expanded > max_nodes:
+      return False
+    for succ in current.iter_push_successors():
+      boxes = level.mask(succ.boxes)
+      if boxes & level.dead_mask:
+        continue
+      if not boxes & ~level.storage_mask:
+        return False
+      if _robots_region(level, succ.robots, level.wall_mask | boxes) & corral:
+        return False
+      key = succ.canonical_state()
+      if key not in seen:
+        seen.add(key)
+        queue.append(succ)
+  return True
+
+def bitboard_goal_state(state):
+  '''Returns True if every box of a BitboardSokobanState is on a storage point'''
+  return state.box_mask & ~state.level.storage_mask == 0
+
+class SokobanPDB:
+    '''
+    An additive pattern database for a Sokoban level. For every set of k boxes (the pattern)
+    it stores the minimum number of pushes needed to move just those boxes onto k different
+    storage points, ignoring the other boxes and letting the robot go anywhere (it only has to
+    be able to stand behind a box to push it). The tables are computed by a retrograde BFS:
+    starting from every placement of k boxes on storage points, boxes are pulled away.
+
+    Every push moves exactly one box, so the pushes needed for disjoint sets of boxes add up.
+    value therefore splits the boxes of a state into groups of k (boxes left over use the
+    single box push distance) and returns the sum, which never exceeds the number of moves
+    still needed. Up to exhaustive_limit boxes the split with the largest sum is used,
+    beyond that the groups are chosen greedily.
+
+    Only the cells from which a box can reach a storage point are numbered (dead squares are
+    left out), giving a table of num_cells ** k bytes, with 255 meaning the boxes can't be
+    stored. If a directory is given, tables are saved there, in a file named after a hash of
+    the level, and memory mapped when they are loaded again, so later runs on the same level
+    don't rebuild them. A saved table starts with a header (a magic string, the file format
+    version, the level hash, k, num_cells and a hash of the cell numbering) and is only loaded
+    if all of these match. With directory None the table is only kept in memory.
+    '''
+
+    _UNSOLVABLE = 255
+    exhaustive_limit = 4
+
+    #header of a saved table: magic, format version, level hash, k, num_cells, numbering hash
+    _MAGIC = b'SOKOPDB\0'
+    _VERSION = 1
+    _HEADER = struct.Struct('<8sH16sBI16s')
+
+    def __init__(self, level, k = 2, directory = None):
+        self.level = level
+        #patterns can't have more boxes than there are storage points
+        self.k = max(1, min(k, len(level.storage)))
+        #number the cells a box can be on in a solvable state
+        self.cells = [cell for cell in range(level.num_cells) if level.min_push_distance[cell] < float('inf')]
+        self.number = dict((cell, i) for i, cell in enumerate(self.cells))
+        self.num_cells = len(self.cells)
+        self.single = [level.min_push_distance[cell] for cell in self.cells]
+        self.path = None
+        if directory is not None:
+            self.path = os.path.join(directory, 'sokoban_pdb_{}_{}.bin'.format(self.level_hash(), self.k))
+        self.table = self._load()
+        if self.table is None:
+            self.table = self._build()
+            self._save()
+
+    def level_hash(self):
+        '''@return: A hex digest identifying the level (dimensions, obstacles and storage points).'''
+        level = self.level
+        description = repr((level.width, level.height, sorted(level.obstacles), sorted(level.storage)))
+        return hashlib.sha1(description.encode()).hexdigest()[:16]
+
+    def _header(self):
+        '''@return: The header of the saved table of this level and k.'''
+        numbering = hashlib.sha1(repr(self.cells).encode()).hexdigest()[:16]
+        return self._HEADER.pack(self._MAGIC, self._VERSION, self.level_hash().encode(), self.k,
+                                 self.num_cells, numbering.encode())
+
+    def _index(self, numbers):
+        '''@return: The table index of a sorted tuple of k cell numbers.'''
+        index = 0
+        for number in numbers:
+            index = index * self.num_cells + number
+        return index
+
+    def _build(self):
+        '''Retrograde BFS over the placements of k boxes, returns the table.'''
+        level = self.level
+        floor = [not (level.wall_mask >> cell) & 1 for cell in range(level.num_cells)]
+        table = bytearray([self._UNSOLVABLE]) * (self.num_cells ** self.k)
+        storage = sorted(self.number[level.index(location)] for location in level.storage)
+        queue = deque()
+        for numbers in itertools.combinations(storage, self.k):
+            table[self._index(numbers)] = 0
+            queue.append(numbers)
+        while queue:
+            numbers = queue.popleft()
+            distance = min(table[self._index(numbers)] + 1, self._UNSOLVABLE - 1)
+            boxes = [self.cells[number] for number in numbers]
+            for i, cell in enumerate(boxes):
+                others = boxes[:i] + boxes[i + 1:]
+                for _, delta in level.moves:
+                    #the box was pushed onto cell from box_from by a robot on robot_from
+                    box_from = cell - delta
+                    robot_from = box_from - delta
+                    if (not floor[box_from] or not floor[robot_from] or box_from in others or
+                        robot_from in others or box_from not in self.number):
+                        continue
+                    pulled = tuple(sorted(numbers[:i] + numbers[i + 1:] + (self.number[box_from],)))
+                    index = self._index(pulled)
+                    if table[index] == self._UNSOLVABLE:
+                        table[index] = distance
+                        queue.append(pulled)
+        return table
+
+    def _load(self):
+        '''@return: The memory mapped table saved for this level, None if there is none (or the file saved
+                   has a different header or size).'''
+        if self.path is None or not os.path.exists(self.path):
+            return None
+        header = self._header()
+        with open(self.path, 'rb') as table_file:
+            if os.fstat(table_file.fileno()).st_size != len(header) + self.num_cells ** self.k:
+                return None
+            if table_file.read(len(header)) != header:
+                return None
+            table = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(table)[len(header):]
+
+    def _save(self):
+        if self.path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            #write to a temporary file first so that no other run ever loads half a table
+            temporary = '{}.{}'.format(self.path, os.getpid())
+            with open(temporary, 'wb') as table_file:
+                table_file.write(self._header())
+                table_file.write(self.table)
+            os.replace(temporary, self.path)
+        except OSError as error:
+            print("Could not save the pattern database:", error)
+
+    def value(self, box_cells):
+        '''
+        @param box_cells: The cell indices of the boxes.
+        @return: A lower bound on the pushes needed to store all the boxes (inf for a deadlock).
+        '''
+        numbers = []
+        for cell in box_cells:
+            number = self.number.get(cell)
+            if number is None:
+                return float('inf')
+            numbers.append(number)
+        numbers.sort()
+        if len(numbers) <= self.exhaustive_limit:
+            return self._best_split(tuple(numbers))
+        return self._greedy_split(numbers)
+
+    def _best_split(self, numbers):
+        '''The largest sum over the ways to split the (sorted) numbers into groups.'''
+        if len(numbers) < self.k:
+            return sum(self.single[number] for number in numbers)
+        first, rest = numbers[0], numbers[1:]
+        best = self.single[first] + self._best_split(rest)
+        for group in itertools.combinations(rest, self.k - 1):
+            value = self.table[self._index((first,) + group)]
+            if value == self._UNSOLVABLE:
+                return float('inf')
+            remaining = tuple(number for number in rest if number not in group)
+            best = max(best, value + self._best_split(remaining))
+        return best
+
+    def _greedy_split(self, numbers):
+        '''Sum over groups chosen greedily, the largest table values first.'''
+        groups = []
+        for group in itertools.combinations(numbers, self.k):
+            value = self.table[self._index(group)]
+            if value == self._UNSOLVABLE:
+                return float('inf')
+            groups.append((value, group))
+        groups.sort(reverse=True)
+        used = set()
+        total = 0
+        for value, group in groups:
+            if used.isdisjoint(group):
+                used.update(group)
+                total += value
+        return total + sum(self.single[number] for number in numbers if number not in used)
+
+
+#SokobanPDB objects are shared by all states of a level
+_pdbs = {}
+
+def sokoban_pdb(state, k = 2, directory = None):
+  '''
+  Returns the (cached) SokobanPDB with patterns of k boxes of a SokobanState or BitboardSokobanState. The tables
+  are only saved to disk (and loaded from it) if a directory is given, e.g.,
+  os.path.join(tempfile.gettempdir(), 'sokoban_pdb'), on the first call for the level.
+  '''
+  level = sokoban_level(state)
+  pdb = _pdbs.get((level, k))
+  if pdb is None:
+    pdb = SokobanPDB(level, k, directory)
+    _pdbs[(level, k)] = pdb
+  return pdb
+
 '''
 Sokoban Problem Set, for testing
 '''
@@ -7,22 +7,24 @@
 #   You may not import or otherwise source any of your own files
 
 import os #for time functions
+import tempfile #for the default pattern database directory
+import copy #for copying box matchings
 from search import * #for search engines
 from sokoban import SokobanState, Direction, PROBLEMS #for Sokoban specific classes and problems
+from sokoban import sokoban_level #for the per level analysis (dead squares, push distances)
+from sokoban import sokoban_pdb #for the pattern database heuristic
+from collections import namedtuple #for the solutions yielded by the anytime searches
 
-grid = []
-grid_y_first = []
-
-deadlock_list = []
-
-
+deadend_value = float('inf')
 
-unsign_int = 0
-storage_int = -1
-obsticle_int = -2
-deadlock_int = -3
+#Directory heur_pdb saves its pattern databases in (see sokoban_pdb), so that later runs on the
+#same level load them instead of building them again. Set the SOKOBAN_PDB_DIR environment variable
+#to use another directory, or to an empty string to keep the tables in memory only.
+PDB_DIRECTORY = os.environ.get('SOKOBAN_PDB_DIR', os.path.join(tempfile.gettempdir(), 'sokoban_pdb')) or None
 
-deadend_value = float('inf')
+#An improved solution found by an anytime search: the goal state, its cost, the
+#(wall-clock) seconds since the search started and the nodes expanded so far.
+AnytimeSolution = namedtuple('AnytimeSolution', ['state', 'cost', 'elapsed', 'expansions'])
 
 
 def sokoban_goal_state(state):
@@ -76,37 +78,25 @@ def heur_alternate(state):
     #heur_manhattan_distance has flaws.
     #Write a heuristic function that improves upon heur_manhattan_distance to estimate distance between the current state and the goal.
     #Your function should return a numeric value for the estimate of the distance to the goal.
-    global grid
-    # global first_time
-
-    if state.parent is None:
-        # deadlock_list = []
-        grid = init_grid(state)
-        # print(grid)
-        # print(deadlock_list)
-
-    free_box = []
-    not_free_storage = []
-    free_storage = []
-    for cur in state.boxes:
-        if iff_box(state, cur) is False:
-            free_box.append(cur)
-        else:
-            not_free_storage.append(cur)
 
-    for storage in state.storage:
-        if storage not in not_free_storage:
-            free_storage.append(storage)
+    # the geometry of the level (dead squares, push distances to the
+    # storage points) is computed once per level, see SokobanLevel
+    level = sokoban_level(state)
+    min_push_distance = level.min_push_distance
+
+    free_storage = [level.push_distances[storage] for storage in state.storage if storage not in state.boxes]
 
     total_distance = 0
-    for box in free_box:
-        if box in deadlock_list:
-            return float('inf')
-        box_storage = float('inf') # distance
-        for storage in free_storage:
-            tmp_b_s = direct_distance(box, storage)
-            if tmp_b_s < box_storage:
-                box_storage = tmp_b_s
+    for box in state.boxes:
+        if box in state.storage:
+            continue
+        cell = level.index(box)
+        if min_push_distance[cell] == deadend_value: # box on a dead square
+            return deadend_value
+        box_storage = deadend_value
+        for distance in free_storage:
+            if distance[cell] < box_storage:
+                box_storage = distance[cell]
         total_distance += box_storage
 
         box_robot = float('inf') # distance        
@@ -118,259 +108,160 @@ def heur_alternate(state):
     return total_distance
 
 
-def iff_box(state, cur):
-    if cur in state.storage:
-        return True
-    return False
-
-
 def direct_distance(f, s):
     return abs(f[0] - s[0]) + abs(f[1] - s[1])
 
-    
-    
 
-def init_grid(state):
-    ''' 
-    Create a whole gride of obsticles and deadlocks
-    whole_grid[<x coordinatge>][<y coordinate>]
-    '''
-    global deadlock_list
-
-    global unsign_int # -1
-    global storage_int # 0
-    global obsticle_int # -2
-    global deadend_value # float('inf')
-
-    deadlock_list = []
-    local_deadlock_list = []
-    grid = []
-
-    ##########################################################
-    # create the grid with only unsign
-    for x in range(state.width):
-        # vertical
-        y_dimension = []
-        for y in range(state.height):
-            y_dimension.append(unsign_int)
-        grid.append(y_dimension)
-    
-    # add the obstacle
-    for ob in state.obstacles:
-        grid[ob[0]][ob[1]] = obsticle_int
-
-    # add the storage
-    for st in state.storage:
-        grid[st[0]][st[1]] = storage_int
-    ##########################################################
-
-    # add deadlocks
-    # first round
-    # add the corner ones
-    for x in range(state.width):
-        for y in range(state.height):
-            if grid[x][y] == unsign_int:
-                cur = (x, y)
-                if corner_deadlock(state,cur) == True:
-                    grid[x][y] = deadlock_int
-                    deadlock_list.append(cur)
-                    local_deadlock_list.append(cur)
-    # print("deadlock_list, initial", deadlock_list)
-    # print("local_deadlock_list, initial", local_deadlock_list)
-
-    ##########################################################
-    # create tow lists, one for x coordinates of deadlocks, one for y coordiantes for the dead locks
-    x_deadlock_list = []
-    y_deadlock_list = []
-    # for dl in deadlock_list:
-    #     x_deadlock_list.append(dl[0])
-    #     print("x_deadlock_list", x_deadlock_list)
-    #     y_deadlock_list.append(dl[1])
-    #     print("y_deadlock_list",y_deadlock_list)
-    for dl in deadlock_list:
-        x_deadlock_list.append(dl[0])
-        y_deadlock_list.append(dl[1])
-    # print("x_deadlock_list", x_deadlock_list)
-    # print("y_deadlock_list", y_deadlock_list)
-
-
-    
-    ##########################################################
-    # create dealocks in between dead locks:
-    dl_ind = 0
-    while local_deadlock_list != []:
-        # print("loop:", dl_ind)
-        # print(local_deadlock_list)
-        cur_dl = local_deadlock_list.pop(0)
-        x_value = cur_dl[0]
-        y_value = cur_dl[1]
-
-        same_hori_line = indices(y_deadlock_list, y_value) # indexes
-        same_hori_line = elim_before_index(same_hori_line, dl_ind)
-        if len(same_hori_line) >= 2: # else, no same ones that are not been checked (after this one)
-            for i in same_hori_line:
-                if abs(x_value - x_deadlock_list[i]) > 1: # if same one or closer, then do not need to check
-                    start_ind = min(x_value, x_deadlock_list[i])
-                    end_ind = max(x_value, x_deadlock_list[i])
-                    hori_seg_between = create_hori_between(grid, y_value, start_ind, end_ind)
-                    # print("hori_seg_between", hori_seg_between)
-                    # print("between_check(hori_seg_between)", between_check(hori_seg_between))
-                    # print("hori_check_bounded(state, y_value, start_ind, end_ind)", hori_check_bounded(state, y_value, start_ind, end_ind))
-                    if (between_check(hori_seg_between) and hori_check_bounded(state, y_value, start_ind, end_ind)): # if only unsign and deadlocks in between
-                        j = start_ind + 1
-                        while j < end_ind:
-                            if (j, y_value) not in deadlock_list:
-                                grid[j][y_value] =deadlock_int
-                                new_deadlock = (j, y_value)
-                                local_deadlock_list.append(new_deadlock)
-                                deadlock_list.append(new_deadlock)
-                                x_deadlock_list.append(j)
-                                y_deadlock_list.append(y_value)
-                            j += 1
-
-
-        same_verti_line = indices(x_deadlock_list, x_value) # indexes
-        same_verti_line = elim_before_index(same_verti_line, dl_ind)
-        if len(same_verti_line) >= 2: # else, no same ones that are not been checked (after this one)
-            # print("same_verti_line", same_verti_line)
-            for i in same_verti_line:
-                if abs(y_value - y_deadlock_list[i]) > 1: # if same one or closer, then do not need to check
-                    start_ind = min(y_value, y_deadlock_list[i])
-                    # print("start_ind", start_ind)
-                    end_ind = max(y_value, y_deadlock_list[i])
-                    # print("end_ind", end_ind)                    
-                    verti_seg_between = grid[x_value][start_ind + 1:end_ind]
-                    # print("cur compare with", (x_value, y_deadlock_list[i]))
-                    # print("verti_seg_between", verti_seg_between)
-                    # print("between_check(verti_seg_between)", between_check(verti_seg_between))
-                    # print("verti_check_bounded(state, x_value, start_ind, end_ind)", verti_check_bounded(state, x_value, start_ind, end_ind))
-
-                    if (between_check(verti_seg_between) and verti_check_bounded(state, x_value, start_ind, end_ind)): # if only unsign and deadlocks in between
-                        j = start_ind + 1
-                        while j < end_ind:
-                            if (x_value, j) not in deadlock_list:
-                                grid[x_value][j] = deadlock_int
-                                new_deadlock = (x_value, j)
-                                local_deadlock_list.append(new_deadlock)
-                                deadlock_list.append(new_deadlock)
-                                x_deadlock_list.append(x_value)
-                                y_deadlock_list.append(j)
-                            j += 1        
-        dl_ind += 1
-    # print("deadlock_list, final", deadlock_list)
-    # print("local_deadlock_list, final", local_deadlock_list)
-
-    return grid
-
-
-def create_hori_between(grid, y_ind, start, end):
-    inds_between = []
-    i = start + 1
-    while i < end:
-        inds_between.append(grid[i][y_ind])
-        i += 1
-    return inds_between
-
-
-def between_check(li):
-    if storage_int in li or obsticle_int in li:
-        return False
-    return True
-
-def indices(dll, value):
-    all_indices = []
-    for i in range(len(dll)):
-        if dll[i] == value:
-            all_indices.append(i)
-    return all_indices
-
-def elim_before_index(li, cur):
-    configed_li = []
-    for i in range(len(li)):
-        if li[i] >= cur:
-            configed_li.append(li[i])
-    return configed_li
-
-
-def hori_check_bounded(state, y_ind, start, end):
-    i = start + 1
-    while i < end:
-        if is_bounded(state, i, y_ind) == False:
-            return False
-        i += 1
-    return True
-
-def verti_check_bounded(state, x_ind, start, end):
-    i = start + 1
-    while i < end:
-        if is_bounded(state, x_ind, i) == False:
-            return False
-        i += 1
-    return True
-
-
-def is_bounded(state, x, y):
-    '''if block is bounded, 1 or more return True, else False'''
-    # at edges
-    if x == 0 or x == state.width - 1:
-        # print("edge1")
-        return True
-    if y == 0 or y == state.height - 1:
-        # print("edge2")
-        return True
-    # if obstacles around
-    if (x - 1, y) in state.obstacles:
-        # print("obstacles1")
-        return True
-    if (x + 1, y) in state.obstacles:
-        # print("obstacles2")
-        return True
-    if (x, y - 1) in state.obstacles:
-        # print("obstacles3")
-        return True
-    if (x, y + 1) in state.obstacles:
-        # print("obstacles4")
-        return True
-    
-    return False
-
-
-def line_seg_grid(grid, ori_x, ori_y):
-    revers_grid = []
-    for y in range(ori_y):
-        x_dimension = []
-        for x in range(ori_x):
-            x_dimension.append(grid[x][y])
-        revers_grid.append(x_dimension)
-    return revers_grid
-
-
-
-
-
-def corner_deadlock(state, cur):
-    global obsticle_int
-
-    x = cur[0]
-    y = cur[1]
-
-    # if 2 adjcent side are bound or obsticle, aka corner, first round
-    if (x == 0) or (x == state.width - 1) or (x - 1, y) in state.obstacles or (x + 1, y) in state.obstacles:
-        up_down = True
-    else:
-        up_down = False
-    
-    if (y == 0) or (y == state.height - 1) or (x, y - 1) in state.obstacles or (x, y + 1) in state.obstacles:
-        left_right = True
+def heur_min_matching(state):
+    '''admissible sokoban heuristic: minimum cost matching of boxes to storage points'''
+    '''INPUT: a sokoban state'''
+    '''OUTPUT: a numeric value that serves as an estimate of the distance of the state to the goal.'''
+    #Every box needs its own storage point, and moving a box from cell c to storage point s
+    #takes at least push_distances[s][c] pushes (each one a robot move). So the cost of
+    #the cheapest assignment of boxes to distinct storage points never overestimates.
+    #The assignment is found with the Hungarian algorithm and kept with the state. When
+    #a successor differs from its parent in a single box (one push) the parent's
+    #assignment is repaired in O(storage^2) instead of being solved again in O(storage^3).
+    level = sokoban_level(state)
+    for box in state.boxes:
+        if level.min_push_distance[level.index(box)] == deadend_value: # box on a dead square
+            return deadend_value
+
+    parent_matching = getattr(state.parent, 'box_matching', None)
+    if parent_matching is None:
+        matching = BoxMatching(level, state.boxes)
     else:
-        left_right = False
-    
-    if up_down and left_right:
-        return True
+        old_boxes = parent_matching.boxes - state.boxes
+        if not old_boxes:
+            matching = parent_matching
+        elif len(old_boxes) == 1:
+            new_boxes = state.boxes - parent_matching.boxes
+            matching = parent_matching.moved(level, next(iter(old_boxes)), next(iter(new_boxes)), state.boxes)
+        else:
+            matching = BoxMatching(level, state.boxes)
+    try:
+        state.box_matching = matching
+    except AttributeError: # states with __slots__ can't keep the matching
+        pass
+    return matching.cost
+
 
-    return False
+class BoxMatching:
+    '''
+    A minimum cost assignment of boxes to storage points (Hungarian algorithm, in its
+    shortest augmenting path form). The problem is made square by adding a dummy box with
+    zero costs for every storage point left over, so that every storage point is assigned.
+    Costs that are inf (box can't be pushed to the storage point) are replaced by _NO_MATCH,
+    and an assignment that has to use one of them costs inf.
+    '''
+
+    #stands in for an inf push distance in the cost matrix
+    _NO_MATCH = 10**9
+
+    def __init__(self, level, boxes):
+        self.boxes = boxes
+        self.columns = list(level.push_distances.values())
+        self.size = len(self.columns)
+        #row 0 and column 0 are not used (the algorithm uses 0 as "unassigned")
+        self.rows = [None] + list(boxes) + [None] * (self.size - len(boxes))
+        self.costs = [None] + [self._costs(level, box) for box in self.rows[1:]]
+        self.u = [0] * (self.size + 1)
+        self.v = [0] * (self.size + 1)
+        self.assigned = [0] * (self.size + 1) #assigned[column] = row
+        for row in range(1, self.size + 1):
+            self._augment(row)
+        self._total()
+
+    def _costs(self, level, box):
+        '''The cost row of a box (of a dummy box if box is None).'''
+        if box is None:
+            return [0] * (self.size + 1)
+        cell = level.index(box)
+        return [0] + [distance[cell] if distance[cell] != deadend_value else self._NO_MATCH
+                      for distance in self.columns]
+
+    def moved(self, level, old_box, new_box, boxes):
+        '''@return: The matching for the boxes after old_box has been pushed to new_box.'''
+        matching = copy.copy(self)
+        matching.boxes = boxes
+        matching.rows = list(self.rows)
+        matching.costs = list(self.costs)
+        matching.u = list(self.u)
+        matching.v = list(self.v)
+        matching.assigned = list(self.assigned)
+
+        row = matching.rows.index(old_box)
+        matching.rows[row] = new_box
+        costs = matching._costs(level, new_box)
+        matching.costs[row] = costs
+        #unassign the row and lower its potential until it is feasible again, every other
+        #row keeps its (optimal) assignment, so one augmenting path restores optimality
+        matching.assigned[matching.assigned.index(row, 1)] = 0
+        v = matching.v
+        matching.u[row] = min(costs[j] - v[j] for j in range(1, self.size + 1))
+        matching._augment(row)
+        matching._total()
+        return matching
+
+    def _augment(self, row):
+        '''Assign row along a shortest augmenting path (reduced costs stay non negative).'''
+        size = self.size
+        costs = self.costs
+        u, v, assigned = self.u, self.v, self.assigned
+        inf = deadend_value
+        minv = [inf] * (size + 1)
+        used = [False] * (size + 1)
+        way = [0] * (size + 1)
+        assigned[0] = row
+        j0 = 0
+        while True:
+            used[j0] = True
+            i0 = assigned[j0]
+            row_costs = costs[i0]
+            ui0 = u[i0]
+            delta = inf
+            j1 = 0
+            for j in range(1, size + 1):
+                if not used[j]:
+                    cur = row_costs[j] - ui0 - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(size + 1):
+                if used[j]:
+                    u[assigned[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if assigned[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            assigned[j0] = assigned[j1]
+            j0 = j1
+
+    def _total(self):
+        total = 0
+        for j in range(1, self.size + 1):
+            total += self.costs[self.assigned[j]][j]
+        self.cost = total if total < self._NO_MATCH else deadend_value
+
+
+def heur_pdb(state):
+    '''Additive pattern database heuristic.'''
+    '''INPUT: a sokoban state'''
+    '''OUTPUT: a numeric value that serves as an estimate of the distance of the state to the goal.'''
+    # The pushes needed to store pairs of boxes (see SokobanPDB in sokoban.py), summed over a
+    # split of the boxes into pairs. Admissible since every push is a move. It ignores the robots,
+    # so it can be cached by the boxes alone (sokoban_box_key). The tables are built on the first
+    # call for a level and saved in PDB_DIRECTORY, later runs load them from there.
+    level = sokoban_level(state)
+    return sokoban_pdb(state, directory=PDB_DIRECTORY).value([level.index(box) for box in state.boxes])
 
-    
 
 def heur_zero(state):
     '''Zero Heuristic can be used to make A* search perform uniform cost search'''
@@ -395,45 +286,68 @@ def fval_function(sN, weight):
     #You must initialize your search engine object as a 'custom' search engine if you supply a custom fval function.
     return sN.gval + weight*sN.hval
 
-def anytime_weighted_astar(initial_state, heur_fn, weight=1., timebound = 10):
+def anytime_weighted_astar(initial_state, heur_fn, weight=1., timebound = 10, weights=None):
 #IMPLEMENT
     '''Provides an implementation of anytime weighted a-star, as described in the HW1 handout'''
     '''INPUT: a sokoban state that represents the start state and a timebound (number of seconds)'''
+    '''weights is an optional (decreasing) sequence of weights to continue the search with, the
+       next one after each improved solution. The search keeps its frontier and only re-orders it.'''
     '''OUTPUT: A goal state (if a goal is found), else False'''
     '''implementation of weighted astar algorithm'''
+    return _last_solution(iter_anytime_weighted_astar(initial_state, heur_fn, weight, timebound, weights))
+
+
+def iter_anytime_weighted_astar(initial_state, heur_fn, weight=1., timebound = 10, weights=None):
+    '''Generator version of anytime_weighted_astar: yields an AnytimeSolution for each improved
+       solution as soon as it is found (the time the caller spends between solutions counts
+       against the timebound)'''
 
-    # initialize the time
-    time = os.times()[0]  #start time
-    due_time = time + timebound
+    # one (wall-clock) time budget shared by all the searches below
+    deadline = Deadline(timebound)
 
     # initialize the search engine
     wrapped_fval_function = (lambda sN: fval_function(sN, weight))
     cur_search = SearchEngine('custom')
     cur_search.init_search(initial_state, sokoban_goal_state, heur_fn, wrapped_fval_function)
-    cur_state = cur_search.search(timebound)
-    best_state = cur_state
-    # best state for now, will change later (maybe)
-
-    # after the initial search, find a new remaining time
-    time_remain = due_time - os.times()[0]
+    cur_state = cur_search.search(deadline)
 
     cost_bound = (float('inf'), float('inf'), float('inf'))
+    weight_schedule = iter(weights or ())
 
-    time = os.times()[0]
-    if cur_state == False: # no other solutions
-        return best_state
-
-    while (time_remain > 0):
-        time = os.times()[0]
+    while cur_state: # until there are no other solutions
         fn_val = heur_fn(cur_state)
         if (cur_state.gval + fn_val <= cost_bound[2]):
+            if cur_state.gval + fn_val < cost_bound[2]:
+                yield AnytimeSolution(cur_state, cur_state.gval, deadline.elapsed(), cur_search.nodes_expanded)
             cost_bound = (float('inf'), float('inf'), cur_state.gval + fn_val)
-            best_state = cur_state
-        cur_state = cur_search.search(time_remain, cost_bound)
-        if cur_state == False: # no other solutions
-            return best_state
-        time_remain -= (os.times()[0] - time)
-    return best_state
+            next_weight = next(weight_schedule, None)
+            if next_weight is not None:
+                cur_search.set_fval_function(lambda sN, w=next_weight: fval_function(sN, w))
+        if deadline.remaining() <= 0:
+            return
+        cur_state = cur_search.search(deadline, cost_bound)
+
+
+def anytime_arastar(initial_state, heur_fn, weights=(5, 3, 2, 1.5, 1), timebound = 10):
+    '''Anytime repairing A* (see ARAStarEngine in search.py) with the given decreasing weights'''
+    '''INPUT: a sokoban state that represents the start state and a timebound (number of seconds)'''
+    '''OUTPUT: A goal state (if a goal is found), else False'''
+    return _last_solution(iter_anytime_arastar(initial_state, heur_fn, weights, timebound))
+
+
+def iter_anytime_arastar(initial_state, heur_fn, weights=(5, 3, 2, 1.5, 1), timebound = 10):
+    '''Generator version of anytime_arastar: yields an AnytimeSolution at the end of each
+       weighted search that improved the solution'''
+    deadline = Deadline(timebound)
+    cur_search = ARAStarEngine(weights)
+    cur_search.init_search(initial_state, sokoban_goal_state, heur_fn)
+    while deadline.remaining() > 0:
+        found = len(cur_search.solutions)
+        cur_search.search(deadline, until_improved=True)
+        if len(cur_search.solutions) == found: # no other solutions
+            return
+        state, cost, bound = cur_search.solutions[-1]
+        yield AnytimeSolution(state, cost, deadline.elapsed(), cur_search.nodes_expanded)
 
 
 def anytime_gbfs(initial_state, heur_fn, timebound = 10):
@@ -442,34 +356,37 @@ def anytime_gbfs(initial_state, heur_fn, timebound = 10):
     '''INPUT: a sokoban state that represents the start state and a timebound (number of seconds)'''
     '''OUTPUT: A goal state (if a goal is found), else False'''
     '''implementation of weighted astar algorithm'''
+    return _last_solution(iter_anytime_gbfs(initial_state, heur_fn, timebound))
+
+
+def iter_anytime_gbfs(initial_state, heur_fn, timebound = 10):
+    '''Generator version of anytime_gbfs: yields an AnytimeSolution for each improved
+       solution as soon as it is found (the time the caller spends between solutions counts
+       against the timebound)'''
 
-    # initialize the time
-    time = os.times()[0]  #start time
-    due_time = time + timebound
+    # one (wall-clock) time budget shared by all the searches below
+    deadline = Deadline(timebound)
 
     # initialize the search engine
     cur_search = SearchEngine('custom')
     cur_search.init_search(initial_state, sokoban_goal_state, heur_fn)
-    cur_state = cur_search.search(timebound)
-    best_state = cur_state
-    # best state for now, will change later (maybe)
-
-    # after the initial search, find a new remaining time
-    time_remain = due_time - os.times()[0]
+    cur_state = cur_search.search(deadline)
 
     cost_bound = (float('inf'), float('inf'), float('inf'))
 
-    time = os.times()[0]
-    if cur_state == False: # no other solutions
-        return best_state
-
-    while (time_remain > 0):
-        time = os.times()[0]
+    while cur_state: # until there are no other solutions
         if (cur_state.gval <= cost_bound[0]):
+            if cur_state.gval < cost_bound[0]:
+                yield AnytimeSolution(cur_state, cur_state.gval, deadline.elapsed(), cur_search.nodes_expanded)
             cost_bound = (cur_state.gval, float('inf'), float('inf'))
-            best_state = cur_state
-        cur_state = cur_search.search(time_remain, cost_bound)
-        if cur_state == False: # no other solutions
-            return best_state
-        time_remain -= (os.times()[0] - time)
+        if deadline.remaining() <= 0:
+            return
+        cur_state = cur_search.search(deadline, cost_bound)
+
+
+def _last_solution(solutions):
+    '''The goal state of the last (best) of the solutions, else False'''
+    best_state = False
+    for solution in solutions:
+        best_state = solution.state
     return best_state